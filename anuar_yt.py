@@ -1,11 +1,17 @@
-from googleapiclient.discovery import build
-import json
+from googleapiclient.errors import HttpError
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
 from datetime import date
 import os
-import random
+import threading
 import time
+import metrics
+from hashtag_store import HASHTAG_DB, HashtagStore
+from history_store import HISTORY_DB, HistoryStore
+from snapshot import publish_snapshot
+from storage import CycleWriter, atomic_write_json, read_json
+from yt_api import ChannelStatsCache, KeyPool, QuotaExhausted, TokenBucket
 
 REGIONS = [
     "AE","AR","AT","AU","AZ","BE","BG","BH","BO","BR","BY","CA","CH","CL","CO","CR",
@@ -18,123 +24,164 @@ REGIONS = [
 ]
 
 SCHEDULE_HOURS = [12, 23]
-HISTORY_DIR = "channels_history"
-os.makedirs(HISTORY_DIR, exist_ok=True)
 
-def get_api_key():
-    with open("api_keys.txt", "r", encoding="utf-8") as f:
-        keys = [k.strip() for k in f.read().split(",") if k.strip()]
-    return random.choice(keys)
+# Параллельный сбор: число регионов одновременно и общий лимит запросов в секунду
+MAX_WORKERS = int(os.environ.get("YT_WORKERS", "8"))
+REQUESTS_PER_SECOND = float(os.environ.get("YT_REQUESTS_PER_SECOND", "10"))
+rate_limiter = TokenBucket(REQUESTS_PER_SECOND)
+# Статистика канала общая для всех регионов цикла; циклы идут раз в ~12 часов
+CHANNEL_STATS_TTL = float(os.environ.get("YT_CHANNEL_STATS_TTL", str(6 * 3600)))
 
-def update_channel_history(channel):
-    channel_id = channel["channel_id"]
-    file_path = os.path.join(HISTORY_DIR, f"{channel_id}.json")
+# Пагинация mostPopular: сколько страниц по 50 видео брать на категорию.
+# Переопределения через YT_CHART_PAGES_OVERRIDES="US=4,US:10=2,20=1":
+# регион, категория или пара регион:категория (самое точное правило побеждает)
+CHART_PAGES = int(os.environ.get("YT_CHART_PAGES", "1"))
+# Дальше не листаем, если новых каналов на странице меньше этой доли
+CHART_MIN_NEW_RATIO = float(os.environ.get("YT_CHART_MIN_NEW_RATIO", "0.2"))
+# Только поля, которые реально используются, — ответы в разы меньше
+CHART_FIELDS = "nextPageToken,items(id,snippet(title,tags,channelId,channelTitle),statistics(viewCount))"
+# Категории, на которые регион отвечает 404: "регион:категория" -> дата; перепроверяются раз в неделю
+UNSUPPORTED_CATEGORIES_FILE = "unsupported_categories.json"
+UNSUPPORTED_RETRY_DAYS = 7
+# Метрики процесса пишутся в конце каждого цикла (textfile-коллектор node_exporter)
+METRICS_FILE = os.environ.get("YT_METRICS_FILE", "collector_metrics.prom")
+CYCLE_SECONDS = metrics.histogram("collector_cycle_seconds", "Длительность фаз цикла сбора", ("phase",),
+                                  buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
 
-    # Загружаем старую историю
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        data = {"channel_id": channel_id, "channel_title": channel["channel_title"],
-                "history": {"daily": [], "monthly": [], "quarterly": []}}
-
-    today = datetime.date.fromisoformat(channel["last_seen"])
-    current_month = today.strftime("%Y-%m")
-    current_quarter = f"{today.year}-Q{(today.month-1)//3+1}"
-
-    # --- Daily ---
-    daily_history = data["history"]["daily"]
-    if not daily_history or daily_history[-1]["date"] != channel["last_seen"]:
-        daily_history.append({
-            "date": channel["last_seen"],
-            "subscribers": channel["subscribers"],
-            "views_total": channel["views_total"],
-            "videos_total": channel["videos_total"]
-        })
+# История каналов хранится в SQLite (см. history_store.py, там же миграция JSON)
+history_store = HistoryStore(HISTORY_DB)
+hashtag_store = HashtagStore(HASHTAG_DB)
 
-    # --- Monthly ---
-    month_history = data["history"]["monthly"]
-    if not month_history or month_history[-1]["month"] != current_month:
-        # Новый месяц — стартовые значения
-        month_history.append({
-            "month": current_month,
-            "subscribers_start": channel["subscribers"],
-            "subscribers_end": channel["subscribers"],
-            "subscribers_growth": 0,
-            "views_start": channel["views_total"],
-            "views_total": channel["views_total"],
-            "views_growth": 0,
-            "videos_start": channel["videos_total"],
-            "videos_total": channel["videos_total"],
-            "videos_added": 0
-        })
-    else:
-        # Обновляем текущий месяц
-        month_record = month_history[-1]
-        month_record["subscribers_end"] = channel["subscribers"]
-        month_record["subscribers_growth"] = month_record["subscribers_end"] - month_record["subscribers_start"]
-        month_record["views_total"] = channel["views_total"]
-        month_record["views_growth"] = month_record["views_total"] - month_record["views_start"]
-        month_record["videos_total"] = channel["videos_total"]
-        month_record["videos_added"] = month_record["videos_total"] - month_record["videos_start"]
-
-    # --- Quarterly ---
-    quarter_history = data["history"]["quarterly"]
-    if not quarter_history or quarter_history[-1]["quarter"] != current_quarter:
-        # Новый квартал — стартовые значения
-        quarter_history.append({
-            "quarter": current_quarter,
-            "subscribers_start": channel["subscribers"],
-            "subscribers_end": channel["subscribers"],
-            "subscribers_growth": 0,
-            "views_start": channel["views_total"],
-            "views_total": channel["views_total"],
-            "views_growth": 0,
-            "videos_start": channel["videos_total"],
-            "videos_total": channel["videos_total"],
-            "videos_added": 0
-        })
-    else:
-        # Обновляем текущий квартал
-        quarter_record = quarter_history[-1]
-        quarter_record["subscribers_end"] = channel["subscribers"]
-        quarter_record["subscribers_growth"] = quarter_record["subscribers_end"] - quarter_record["subscribers_start"]
-        quarter_record["views_total"] = channel["views_total"]
-        quarter_record["views_growth"] = quarter_record["views_total"] - quarter_record["views_start"]
-        quarter_record["videos_total"] = channel["videos_total"]
-        quarter_record["videos_added"] = quarter_record["videos_total"] - quarter_record["videos_start"]
+def parse_page_overrides(value):
+    overrides = {}
+    for rule in value.split(","):
+        if "=" in rule:
+            target, pages = rule.split("=", 1)
+            overrides[target.strip()] = int(pages)
+    return overrides
+
+
+CHART_PAGES_OVERRIDES = parse_page_overrides(os.environ.get("YT_CHART_PAGES_OVERRIDES", ""))
+
+
+def chart_pages(region, category_id):
+    for target in (f"{region}:{category_id}", region, category_id):
+        if target in CHART_PAGES_OVERRIDES:
+            return CHART_PAGES_OVERRIDES[target]
+    return CHART_PAGES
+
+
+_unsupported = None
+_unsupported_lock = threading.Lock()
+
+
+def _unsupported_categories():
+    global _unsupported
+    if _unsupported is None:
+        _unsupported = read_json(UNSUPPORTED_CATEGORIES_FILE, {})
+    return _unsupported
+
+
+def is_unsupported(region, category_id):
+    with _unsupported_lock:
+        since = _unsupported_categories().get(f"{region}:{category_id}")
+    if since is None:
+        return False
+    age = datetime.date.today() - datetime.date.fromisoformat(since)
+    return age.days < UNSUPPORTED_RETRY_DAYS
+
+
+def mark_unsupported(region, category_id):
+    with _unsupported_lock:
+        _unsupported_categories()[f"{region}:{category_id}"] = datetime.date.today().isoformat()
+
+
+def save_unsupported_categories():
+    with _unsupported_lock:
+        if _unsupported is not None:
+            atomic_write_json(UNSUPPORTED_CATEGORIES_FILE, _unsupported, pretty=True)
+
+
+_key_pool = None
+_channel_stats = None
+_key_pool_guard = threading.Lock()
 
-    # Сохраняем историю
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
+def get_key_pool():
+    global _key_pool
+    with _key_pool_guard:
+        if _key_pool is None:
+            _key_pool = KeyPool(rate_limiter=rate_limiter)
+        return _key_pool
 
 
+def get_channel_stats_cache():
+    global _channel_stats
+    key_pool = get_key_pool()
+    with _key_pool_guard:
+        if _channel_stats is None:
+            _channel_stats = ChannelStatsCache(key_pool, CHANNEL_STATS_TTL)
+        return _channel_stats
 
-def collect_trending(region):
-    api_key = get_api_key()
-    youtube = build("youtube", "v3", developerKey=api_key)
+def update_channel_history(channel):
+    history_store.append_many([channel])
+
+
+def fetch_chart(key_pool, region, category_id, seen_channels):
+    """
+    Видео категории из mostPopular, до chart_pages() страниц.
+    Листает дальше, только пока страницы приносят новые для региона каналы;
+    seen_channels (каналы региона из предыдущих категорий) дополняется.
+    Возвращает (items, число запрошенных страниц).
+    """
+    items = []
+    page_token = None
+    pages = 0
+    for _ in range(chart_pages(region, category_id)):
+        response = key_pool.execute(lambda youtube: youtube.videos().list(
+            part="snippet,statistics",
+            chart="mostPopular",
+            regionCode=region,
+            videoCategoryId=category_id,
+            maxResults=50,
+            pageToken=page_token,
+            fields=CHART_FIELDS
+        ), labels={"method": "videos.list", "region": region, "category": category_id},
+            conditional=True)
+        pages += 1
+        page_items = response.get("items", [])
+        items.extend(page_items)
+        new_channels = {item["snippet"]["channelId"] for item in page_items} - seen_channels
+        seen_channels |= new_channels
+        page_token = response.get("nextPageToken")
+        if not page_token or len(new_channels) < CHART_MIN_NEW_RATIO * len(page_items):
+            break
+    return items, pages
+
+
+
+
+def collect_trending(region, writer=None):
+    key_pool = get_key_pool()
     date_str = datetime.date.today().isoformat()
     filename = f"trending_channels_{region}.json"
-    hashtag_file = "trend_hashtags.txt"
+    own_writer = writer is None
+    if own_writer:
+        writer = CycleWriter(history_store, hashtag_store)
 
     category_ids = [
         "1","10","15","17","19","20","22","23","24","25","26","27","28"
     ]
 
     videos = []
+    seen_channels = set()
     for category_id in category_ids:
+        if is_unsupported(region, category_id):
+            continue
         try:
-            request = youtube.videos().list(
-                part="snippet,statistics",
-                chart="mostPopular",
-                regionCode=region,
-                videoCategoryId=category_id,
-                maxResults=50
-            )
-            response = request.execute()
-
-            for item in response.get("items", []):
+            items, pages = fetch_chart(key_pool, region, category_id, seen_channels)
+
+            for item in items:
                 videos.append({
                     "video_id": item["id"],
                     "title": item["snippet"]["title"],
@@ -147,7 +194,18 @@ def collect_trending(region):
                     "trend_type": get_trend_type(),
                     "date": date_str
                 })
-            print(f"[{region}] Category {category_id}: {len(response.get('items', []))} videos")
+            print(f"[{region}] Category {category_id}: {len(items)} videos, {pages} pages")
+        except QuotaExhausted:
+            # Все ключи исчерпаны — регион помечается как неудачный, а не теряется молча
+            raise
+        except HttpError as e:
+            if e.resp.status == 404:
+                # Категория недоступна в регионе — не тратим на неё запросы следующие циклы
+                print(f"[{region}] Category {category_id} is not available, skipping")
+                mark_unsupported(region, category_id)
+            else:
+                print(f"[{region}] Error for category {category_id}: {e}")
+            continue
         except Exception as e:
             print(f"[{region}] Error for category {category_id}: {e}")
             continue
@@ -161,105 +219,55 @@ def collect_trending(region):
         for tag in unique_tags:
             hashtag_counter[tag] += 1
 
-    total_videos = len(videos) if videos else 1  # защита от деления на ноль
-
-    # Подготовка новых хэштегов с процентами
-    new_stats = {
-        tag: round((count / total_videos) * 100, 2)
-        for tag, count in hashtag_counter.items()
-    }
-
-    # Загрузка старых данных, если есть
-    if os.path.exists(hashtag_file):
-        with open(hashtag_file, "r", encoding="utf-8") as f:
-            existing_lines = [line.strip() for line in f if line.strip()]
-        existing_map = {}
-        for line in existing_lines:
-            if "|" in line:
-                tag, pct = line.split("|", 1)
-                existing_map[tag.strip().lower()] = pct.strip()
-            else:
-                existing_map[line.strip().lower()] = "0%"
-    else:
-        existing_map = {}
-
-    # Обновляем процент или добавляем новый тег
-    for tag, pct in new_stats.items():
-        existing_map[tag] = f"{pct}%"
+    # Сырые счётчики по региону и дню; проценты считаются при запросе из hashtag_store
+    if videos:
+        writer.update_hashtags(date_str, region, len(videos), hashtag_counter)
 
-    # Сохраняем обратно без дубликатов
-    with open(hashtag_file, "w", encoding="utf-8") as f:
-        for tag in sorted(existing_map.keys()):
-            f.write(f"{tag} | {existing_map[tag]}\n")
-
-    print(f"[{region}] Updated {len(new_stats)} hashtags (with percentages).")
+    print(f"[{region}] Counted {len(hashtag_counter)} hashtags.")
 
     # === Сбор статистики по каналам ===
-    counter = Counter([v["channel_id"] for v in videos])
-    trending_channels = [
-        {
-            "channel_id": cid,
-            "channel_title": next(v["channel_title"] for v in videos if v["channel_id"] == cid),
-            "count": count,
-            "last_seen": date_str
-        }
-        for cid, count in counter.most_common()
-    ]
-
-    # Получаем расширенные данные о каналах
-    channel_ids = [c["channel_id"] for c in trending_channels]
-    channel_stats = []
-
-    for i in range(0, len(channel_ids), 50):
-        batch_ids = channel_ids[i:i + 50]
-        channel_request = youtube.channels().list(
-            part="snippet,statistics",
-            id=",".join(batch_ids)
-        )
-        channel_response = channel_request.execute()
-
-        for ch in channel_response.get("items", []):
-            stats = ch.get("statistics", {})
-            snippet = ch.get("snippet", {})
-            channel_stats.append({
-                "channel_id": ch["id"],
-                "channel_title": snippet.get("title"),
-                "custom_url": f"https://www.youtube.com/channel/{ch['id']}",
-                "subscribers": int(stats.get("subscriberCount", 0)),
-                "views_total": int(stats.get("viewCount", 0)),
-                "videos_total": int(stats.get("videoCount", 0)),
-                "created_at": snippet.get("publishedAt"),
+    # Один проход по видео: первое название канала и число его видео в тренде
+    channels_by_id = {}
+    for v in videos:
+        ch = channels_by_id.get(v["channel_id"])
+        if ch is None:
+            channels_by_id[v["channel_id"]] = {
+                "channel_id": v["channel_id"],
+                "channel_title": v["channel_title"],
+                "count": 1,
                 "last_seen": date_str
-            })
+            }
+        else:
+            ch["count"] += 1
+    # Порядок как у Counter.most_common(): по убыванию count, при равенстве — по первому появлению
+    trending_channels = sorted(channels_by_id.values(), key=lambda c: c["count"], reverse=True)
 
-    # Объединяем данные каналов
-    for ch in trending_channels:
-        info = next((s for s in channel_stats if s["channel_id"] == ch["channel_id"]), None)
-        if info:
-            ch.update(info)
-    # Обновляем историю для каждого канала
-    for ch in trending_channels:
-        update_channel_history(ch)
-
-
-    # Загрузка старых данных, если есть
-    if os.path.exists(filename):
-        with open(filename, "r", encoding="utf-8") as f:
-            existing_data = json.load(f)
-    else:
-        existing_data = []
+    # Получаем расширенные данные о каналах (общий кеш, пачки по 50 между регионами)
+    channel_items = get_channel_stats_cache().get_many(list(channels_by_id))
 
-    # Обновляем или добавляем новые каналы без дубликатов
-    existing_map_channels = {c["channel_id"]: c for c in existing_data}
-    for new_ch in trending_channels:
-        existing_map_channels[new_ch["channel_id"]] = new_ch
+    # Объединяем данные каналов
+    for cid, ch in channel_items.items():
+        stats = ch.get("statistics", {})
+        snippet = ch.get("snippet", {})
+        channels_by_id[cid].update({
+            "channel_id": ch["id"],
+            "channel_title": snippet.get("title"),
+            "custom_url": f"https://www.youtube.com/channel/{ch['id']}",
+            "subscribers": int(stats.get("subscriberCount", 0)),
+            "views_total": int(stats.get("viewCount", 0)),
+            "videos_total": int(stats.get("videoCount", 0)),
+            "created_at": snippet.get("publishedAt"),
+            "last_seen": date_str
+        })
 
-    # Сохраняем обновлённый список каналов
-    unique_channels = list(existing_map_channels.values())
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(unique_channels, f, ensure_ascii=False, indent=2)
+    # История и файл региона пишутся один раз за цикл в writer.flush()
+    writer.update_history(trending_channels)
+    writer.update_region(filename, trending_channels)
 
-    print(f"[{region}] Saved {len(unique_channels)} unique channels to {filename}\n")
+    if own_writer:
+        writer.flush()
+        save_unsupported_categories()
+    print(f"[{region}] Collected {len(trending_channels)} channels for {filename}\n")
 
 
 
@@ -287,18 +295,40 @@ def wait_until_next_run():
     time.sleep(seconds_to_wait)
 
 
+def run_cycle(regions=REGIONS):
+    """Один цикл сбора по всем регионам. Возвращает число уникальных каналов."""
+    writer = CycleWriter(history_store, hashtag_store)
+    with CYCLE_SECONDS.time(phase="collect"):
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {pool.submit(collect_trending, region, writer): region for region in regions}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{futures[future]}] Region failed: {e}")
+    get_key_pool().save()
+    save_unsupported_categories()
+    # Каждый файл региона, хэштеги и история пишутся один раз за цикл
+    with CYCLE_SECONDS.time(phase="flush"):
+        counts = writer.flush()
+    # Один снапшот для сервера вместо разбора ~200 JSON-файлов регионов
+    try:
+        with CYCLE_SECONDS.time(phase="snapshot"):
+            publish_snapshot()
+    except Exception as e:
+        print(f"Snapshot failed: {e}")
+    try:
+        metrics.dump(METRICS_FILE)
+    except OSError as e:
+        print(f"Metrics dump failed: {e}")
+    return sum(counts.values())
+
+
 def main():
     print("YouTube Trending Collector started.")
     while True:
         print("\n=== New collection cycle ===")
-        total_channels = 0
-        for region in REGIONS:
-            collect_trending(region)
-            filename = f"trending_channels_{region}.json"
-            if os.path.exists(filename):
-                with open(filename, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                total_channels += len(data)
+        total_channels = run_cycle()
         print(f"\n=== Cycle completed. Total unique channels across all regions: {total_channels} ===\n")
         wait_until_next_run()
 
@@ -1,79 +1,140 @@
-from googleapiclient.discovery import build
-import json
+from concurrent.futures import ThreadPoolExecutor
 import os
-import random
 import time
+from snapshot import publish_snapshot
+from storage import atomic_write_json, read_json
+from yt_api import CHANNELS_BATCH, CHANNELS_LATENCY, KeyPool, TokenBucket, retry_with_backoff
 
-def get_api_key():
-    with open("api_keys.txt", "r", encoding="utf-8") as f:
-        keys = [k.strip() for k in f.read().split(",") if k.strip()]
-    return random.choice(keys)
+# Через сколько секунд статистика обогащённого канала считается устаревшей
+ENRICH_TTL = float(os.environ.get("YT_ENRICH_TTL", str(24 * 3600)))
+ENRICH_WORKERS = int(os.environ.get("YT_ENRICH_WORKERS", "8"))
+REQUESTS_PER_SECOND = float(os.environ.get("YT_REQUESTS_PER_SECOND", "10"))
+# channel_id -> время последнего обновления из channels.list
+ENRICH_STATE_FILE = "enrichment_state.json"
 
-def fetch_channel_data(youtube, channel_ids):
-    result = []
-    for i in range(0, len(channel_ids), 50):
-        batch = channel_ids[i:i+50]
-        try:
-            request = youtube.channels().list(
-                part="snippet,statistics",
-                id=",".join(batch)
-            )
-            response = request.execute()
-            for item in response.get("items", []):
-                snippet = item.get("snippet", {})
-                stats = item.get("statistics", {})
-                data = {
-                    "channel_id": item["id"],
-                    "title": snippet.get("title"),
-                    "description": snippet.get("description"),
-                    "published_at": snippet.get("publishedAt"),
-                    "channel_url": f"https://www.youtube.com/channel/{item['id']}",
-                    "thumbnail": snippet.get("thumbnails", {}).get("high", {}).get("url"),
-                    "subscribers": int(stats.get("subscriberCount", 0)),
-                    "views": int(stats.get("viewCount", 0)),
-                    "videos": int(stats.get("videoCount", 0)),
-                }
-                result.append(data)
-        except Exception as e:
-            print(f"Ошибка при запросе каналов: {e}")
-            time.sleep(2)
-            continue
-    return result
+def channel_record(item):
+    snippet = item.get("snippet", {})
+    stats = item.get("statistics", {})
+    return {
+        "channel_id": item["id"],
+        "title": snippet.get("title"),
+        "description": snippet.get("description"),
+        "published_at": snippet.get("publishedAt"),
+        "channel_url": f"https://www.youtube.com/channel/{item['id']}",
+        "thumbnail": snippet.get("thumbnails", {}).get("high", {}).get("url"),
+        "subscribers": int(stats.get("subscriberCount", 0)),
+        "views": int(stats.get("viewCount", 0)),
+        "videos": int(stats.get("videoCount", 0)),
+    }
 
-def process_files():
-    api_key = get_api_key()
-    youtube = build("youtube", "v3", developerKey=api_key)
+def fetch_channel_data(key_pool, channel_ids, workers=ENRICH_WORKERS):
+    """
+    Запрашивает каналы пачками по 50 параллельно, с повторами и backoff.
+    Возвращает (channel_id -> запись, id из пачек, которые так и не удалось получить).
+    """
+    batches = [channel_ids[i:i + CHANNELS_BATCH] for i in range(0, len(channel_ids), CHANNELS_BATCH)]
 
-    for filename in os.listdir():
-        if filename.startswith("trending_channels_") and filename.endswith(".json") and not filename.endswith("_filtered.json"):
-            print(f"\nОбработка файла: {filename}")
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    def fetch(batch):
+        return retry_with_backoff(lambda: key_pool.execute(lambda youtube: youtube.channels().list(
+            part="snippet,statistics",
+            id=",".join(batch)
+        ), latency=CHANNELS_LATENCY))
 
-            filtered_name = filename.replace(".json", "_filtered.json")
+    result = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch, future in [(b, pool.submit(fetch, b)) for b in batches]:
+            try:
+                response = future.result()
+            except Exception as e:
+                print(f"Ошибка при запросе каналов: {e}")
+                failed.extend(batch)
+                continue
+            for item in response.get("items", []):
+                result[item["id"]] = channel_record(item)
+    return result, failed
 
-            if os.path.exists(filtered_name):
-                with open(filtered_name, "r", encoding="utf-8") as f:
-                    filtered_data = json.load(f)
-            else:
-                filtered_data = []
+def load_region(filename):
+    filtered_name = filename.replace(".json", "_filtered.json")
+    return filename, filtered_name, read_json(filename, []), read_json(filtered_name, [])
 
-            existing_ids = {c["channel_id"] for c in filtered_data if "channel_id" in c}
-            new_channel_ids = [c["channel_id"] for c in data if c["channel_id"] not in existing_ids]
+def process_files():
+    key_pool = KeyPool(rate_limiter=TokenBucket(REQUESTS_PER_SECOND))
+    state = read_json(ENRICH_STATE_FILE, {})
+    now = time.time()
 
-            print(f"Новых каналов для добавления: {len(new_channel_ids)}")
+    filenames = [
+        f for f in os.listdir()
+        if f.startswith("trending_channels_") and f.endswith(".json") and not f.endswith("_filtered.json")
+    ]
+    with ThreadPoolExecutor(max_workers=ENRICH_WORKERS) as pool:
+        regions = list(pool.map(load_region, filenames))
 
-            if not new_channel_ids:
-                print("Новых каналов нет, пропуск файла.")
-                continue
+    # Один проход по всем регионам: новые каналы и устаревшие записи, без повторов
+    new_ids, stale_ids = {}, {}
+    enriched_ids, seen_ids = set(), set()
+    for filename, filtered_name, data, filtered_data in regions:
+        existing_ids = {c["channel_id"] for c in filtered_data if "channel_id" in c}
+        enriched_ids |= existing_ids
+        seen_ids |= existing_ids
+        for c in data:
+            seen_ids.add(c["channel_id"])
+            if c["channel_id"] not in existing_ids:
+                new_ids[c["channel_id"]] = None
+        for cid in existing_ids:
+            if now - state.get(cid, 0) >= ENRICH_TTL:
+                stale_ids[cid] = None
+    for cid in list(new_ids):
+        stale_ids.pop(cid, None)
+        # Канал недавно запрашивали, но API его не вернул (удалён или скрыт) — ждём ENRICH_TTL
+        if cid not in enriched_ids and now - state.get(cid, 0) < ENRICH_TTL:
+            del new_ids[cid]
+    # Каналы, которых больше нет ни в одном файле региона, из состояния убираем
+    for cid in set(state) - seen_ids:
+        del state[cid]
 
-            new_data = fetch_channel_data(youtube, new_channel_ids)
-            filtered_data.extend(new_data)
+    print(f"Новых каналов: {len(new_ids)}, устаревших для обновления: {len(stale_ids)}")
+    if not new_ids and not stale_ids:
+        atomic_write_json(ENRICH_STATE_FILE, state)
+        print("Обновлять нечего.")
+        return
 
-            with open(filtered_name, "w", encoding="utf-8") as f:
-                json.dump(filtered_data, f, ensure_ascii=False, indent=2)
+    fetched, failed = fetch_channel_data(key_pool, list(new_ids) + list(stale_ids))
+    failed = set(failed)
+    for cid in list(new_ids) + list(stale_ids):
+        if cid not in failed:
+            # Удалённые каналы тоже отмечаем, чтобы не запрашивать их каждый запуск
+            state[cid] = now
 
+    def update_region(region):
+        filename, filtered_name, data, filtered_data = region
+        changed = False
+        for i, c in enumerate(filtered_data):
+            fresh = fetched.get(c.get("channel_id"))
+            if fresh is not None and fresh != c:
+                filtered_data[i] = fresh
+                changed = True
+        existing_ids = {c["channel_id"] for c in filtered_data if "channel_id" in c}
+        for c in data:
+            cid = c["channel_id"]
+            if cid not in existing_ids and cid in fetched:
+                filtered_data.append(fetched[cid])
+                existing_ids.add(cid)
+                changed = True
+        if changed:
+            atomic_write_json(filtered_name, filtered_data)
             print(f"Файл обновлён: {filtered_name} (всего {len(filtered_data)} каналов)")
+        return changed
+
+    with ThreadPoolExecutor(max_workers=ENRICH_WORKERS) as pool:
+        updated = sum(pool.map(update_region, regions))
+
+    atomic_write_json(ENRICH_STATE_FILE, state)
+    key_pool.save()
+    print(f"Обновлено файлов: {updated}, не удалось получить каналов: {len(failed)}")
+    if updated:
+        # *_filtered.json обновились — пересобираем снапшот для сервера
+        publish_snapshot()
 
 if __name__ == "__main__":
     process_files()
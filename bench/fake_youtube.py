@@ -0,0 +1,226 @@
+"""
+Локальная замена YouTube Data API для бенчмарков: videos.list (chart=mostPopular)
+и channels.list с синтетическими детерминированными данными, задержкой,
+ошибками квоты и ETag (304 на If-None-Match). Подключается вместо googleapiclient.discovery.build:
+
+    api = FakeYouTube(latency=0.05, quota_per_key=500)
+    KeyPool(lambda key: api.build("youtube", "v3", developerKey=key), keys=[...])
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+from googleapiclient.errors import HttpError
+import httplib2
+
+# Слова для названий и описаний: данные в проде в основном кириллица, арабский и тайский
+WORDS = [
+    "music", "news", "gaming", "live", "official", "kids", "tv", "shorts",
+    "музыка", "новости", "игры", "канал", "официальный", "шоу", "детям",
+    "موسيقى", "أخبار", "قناة", "ألعاب", "مباشر",
+    "เพลง", "ข่าว", "เกม", "ช่อง", "สด",
+]
+TAGS = [f"#{w}" for w in WORDS] + ["trending", "viral", "2025", "funny", "tutorial"]
+
+
+def channel_id(index):
+    """Синтетический id канала той же длины, что и настоящие (24 символа)."""
+    return f"UCbench{index:017d}"
+
+
+def synthetic_channel(index, seed=0):
+    """Элемент channels.list (snippet,statistics) для канала с номером index."""
+    rng = random.Random(f"{seed}:channel:{index}")
+    cid = channel_id(index)
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    # Часть каналов создана недавно — для фильтров date=week|month|90days
+    published = time.gmtime(int(time.time()) - int(rng.expovariate(1 / (3 * 365 * 86400))))
+    subscribers = int(10 ** rng.uniform(2, 8))
+    return {
+        "id": cid,
+        "snippet": {
+            "title": f"{title} {index}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 40))),
+            "publishedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", published),
+            "thumbnails": {"high": {"url": f"https://yt3.ggpht.com/{cid}=s800-c-k-c0x00ffffff-no-rj"}},
+        },
+        "statistics": {
+            "subscriberCount": str(subscribers),
+            "viewCount": str(subscribers * rng.randint(50, 2000)),
+            "videoCount": str(rng.randint(1, 5000)),
+        },
+    }
+
+
+def http_error(status, reason):
+    """HttpError в том же виде, что отдаёт googleapiclient (reason в теле ответа)."""
+    body = {"error": {"code": status, "errors": [{"reason": reason}], "message": reason}}
+    return HttpError(httplib2.Response({"status": status}), json.dumps(body).encode("utf-8"))
+
+
+class _Request:
+    """Повторяет интерфейс HttpRequest, которым пользуется KeyPool: uri, headers, callbacks."""
+
+    def __init__(self, api, key, method, fn, params):
+        self._api = api
+        self._key = key
+        self._method = method
+        self._fn = fn
+        self.method = "GET"
+        self.uri = f"https://fake.youtube/{method}?" + urlencode(sorted(
+            (k, v) for k, v in dict(params, key=key).items() if v is not None))
+        self.headers = {}
+        self.response_callbacks = []
+
+    def add_response_callback(self, cb):
+        self.response_callbacks.append(cb)
+
+    def execute(self, **kwargs):
+        return self._api._execute(self, self._fn)
+
+
+class _Videos:
+    def __init__(self, api, key):
+        self._api = api
+        self._key = key
+
+    def list(self, part=None, chart=None, regionCode=None, videoCategoryId=None,
+             maxResults=5, pageToken=None, fields=None, **kwargs):
+        params = {"part": part, "chart": chart, "regionCode": regionCode, "videoCategoryId": videoCategoryId,
+                  "maxResults": maxResults, "pageToken": pageToken, "fields": fields}
+        return _Request(self._api, self._key, "videos.list",
+                        lambda: self._api.chart_page(regionCode, videoCategoryId, maxResults, pageToken),
+                        params)
+
+
+class _Channels:
+    def __init__(self, api, key):
+        self._api = api
+        self._key = key
+
+    def list(self, part=None, id="", fields=None, **kwargs):
+        ids = [cid for cid in id.split(",") if cid]
+        return _Request(self._api, self._key, "channels.list", lambda: self._api.channels_page(ids),
+                        {"part": part, "id": id, "fields": fields})
+
+
+class _Client:
+    def __init__(self, api, key):
+        self._api = api
+        self._key = key
+
+    def videos(self):
+        return _Videos(self._api, self._key)
+
+    def channels(self):
+        return _Channels(self._api, self._key)
+
+
+class FakeYouTube:
+    """
+    Синтетический YouTube API в процессе.
+
+    pages × videos_per_page видео на (регион, категорию); каналы видео берутся
+    из пула channel_pool со смещением к популярным, так что регионы и категории
+    пересекаются, как в настоящих трендах. latency (+ до jitter) — задержка
+    каждого execute(); quota_per_key — после стольких запросов ключ получает
+    403 quotaExceeded; quota_error_rate — доля случайных quotaExceeded;
+    unavailable — категории, на которые API отвечает 404. Ответы несут ETag
+    (хеш тела), на совпавший If-None-Match API отвечает 304.
+    """
+
+    def __init__(self, videos_per_page=50, pages=4, channel_pool=20000,
+                 latency=0.0, jitter=0.0, quota_per_key=None, quota_error_rate=0.0,
+                 unavailable=(), seed=0):
+        self.videos_per_page = videos_per_page
+        self.pages = pages
+        self.channel_pool = channel_pool
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_key = quota_per_key
+        self.quota_error_rate = quota_error_rate
+        self.unavailable = set(unavailable)
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.calls = Counter()
+        self.key_calls = Counter()
+        self.errors = Counter()
+        self.not_modified = 0
+
+    def build(self, service_name="youtube", version="v3", developerKey=None, **kwargs):
+        return _Client(self, developerKey)
+
+    def _execute(self, request, fn):
+        key = request._key
+        with self._lock:
+            self.calls[request._method] += 1
+            self.key_calls[key] += 1
+            over_quota = self.quota_per_key is not None and self.key_calls[key] > self.quota_per_key
+            random_error = self._rng.random() < self.quota_error_rate
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if over_quota or random_error:
+            with self._lock:
+                self.errors["quotaExceeded"] += 1
+            raise http_error(403, "quotaExceeded")
+        body = fn()
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+        resp = httplib2.Response({"status": 200, "etag": etag})
+        if request.headers.get("If-None-Match") == etag:
+            resp.status = 304
+        for cb in request.response_callbacks:
+            cb(resp)
+        if resp.status == 304:
+            with self._lock:
+                self.not_modified += 1
+            raise HttpError(resp, b"")
+        return body
+
+    def chart_page(self, region, category_id, max_results, page_token):
+        if category_id in self.unavailable:
+            with self._lock:
+                self.errors["notFound"] += 1
+            raise http_error(404, "videoChartNotFound")
+        page = int(page_token or 0)
+        rng = random.Random(f"{self.seed}:chart:{region}:{category_id}:{page}")
+        count = min(max_results, self.videos_per_page)
+        items = []
+        for i in range(count):
+            # Квадрат равномерного — популярные каналы попадают в тренды чаще
+            index = int(self.channel_pool * rng.random() ** 2)
+            cid = channel_id(index)
+            items.append({
+                "id": f"vid{region}{category_id}p{page}n{i}",
+                "snippet": {
+                    "title": " ".join(rng.choice(WORDS) for _ in range(6)),
+                    "tags": rng.sample(TAGS, rng.randint(0, 8)),
+                    "channelId": cid,
+                    "channelTitle": f"channel {index}",
+                },
+                "statistics": {"viewCount": str(rng.randint(1_000, 50_000_000))},
+            })
+        response = {"items": items}
+        if page + 1 < self.pages:
+            response["nextPageToken"] = str(page + 1)
+        return response
+
+    def channels_page(self, ids):
+        items = []
+        for cid in ids:
+            if cid.startswith("UCbench"):
+                items.append(synthetic_channel(int(cid[len("UCbench"):]), self.seed))
+        return {"items": items}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "not_modified": self.not_modified,
+                "keys": len(self.key_calls),
+            }
@@ -0,0 +1,119 @@
+"""
+Генератор синтетических данных сервера в масштабе от текущих:
+
+    python -m bench.generate_data /tmp/bench_data --scale 10 --history-days 30
+
+Пишет *_filtered.json по регионам, channels_history.db с дневной историей,
+hashtags.db и снапшот каналов — всё, что читает server.py.
+"""
+import argparse
+import contextlib
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anuar_yt_2 import channel_record
+from bench.fake_youtube import TAGS, synthetic_channel
+from hashtag_store import HASHTAG_DB, HashtagStore
+from history_store import HISTORY_DB, HistoryStore
+from snapshot import publish_snapshot
+from storage import atomic_write_json
+
+# Текущий объём данных: записей во всех *_filtered.json, уникальных каналов, регионов с данными
+BASE_ROWS = 30000
+BASE_CHANNELS = 10700
+BASE_REGIONS = 78
+
+
+@contextlib.contextmanager
+def working_dir(path):
+    """
+    Модули сборщика и сервера открывают файлы и БД относительно текущей папки
+    (в том числе при импорте), поэтому бенчмарки работают внутри папки данных.
+    """
+    os.makedirs(path, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def generate(out_dir, scale=10, history_days=14, seed=0):
+    """Генерирует данные в out_dir. Возвращает {"rows", "channels", "history_points"}."""
+    with working_dir(out_dir):
+        return _generate(scale, history_days, seed)
+
+
+def _generate(scale, history_days, seed):
+    from anuar_yt import REGIONS
+
+    rng = random.Random(seed)
+    regions = REGIONS[:BASE_REGIONS]
+    pool = int(BASE_CHANNELS * scale)
+    per_region = min(pool, int(BASE_ROWS * scale / len(regions)))
+    channels = {}
+    rows = 0
+
+    for region in regions:
+        picked = set()
+        while len(picked) < per_region:
+            picked.add(int(pool * rng.random() ** 2))
+        records = []
+        for index in sorted(picked):
+            record = channels.get(index)
+            if record is None:
+                record = channels[index] = channel_record(synthetic_channel(index, seed))
+            records.append(record)
+        atomic_write_json(f"trending_channels_{region}_filtered.json", records)
+        rows += len(records)
+
+    history = HistoryStore(HISTORY_DB)
+    hashtags = HashtagStore(HASHTAG_DB)
+    today = datetime.date.today()
+    points = 0
+    for back in range(history_days - 1, -1, -1):
+        day = (today - datetime.timedelta(days=back)).isoformat()
+        growth = 1 + 0.002 * (history_days - back)
+        day_rows = [{
+            "channel_id": c["channel_id"],
+            "channel_title": c["title"],
+            "subscribers": int(c["subscribers"] * growth),
+            "views_total": int(c["views"] * growth),
+            "videos_total": c["videos"] + history_days - back,
+            "last_seen": day,
+        } for c in channels.values()]
+        points += history.append_many(day_rows)
+
+        samples = []
+        for region in regions:
+            videos = 13 * 50
+            counter = {tag: rng.randint(1, videos // 4) for tag in rng.sample(TAGS, len(TAGS) // 2)}
+            samples.append((day, region, videos, counter))
+        hashtags.add_counts(samples)
+
+    publish_snapshot()
+    return {"rows": rows, "channels": len(channels), "history_points": points}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=float, default=10, help="во сколько раз больше текущих данных")
+    parser.add_argument("--history-days", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = generate(args.out_dir, args.scale, args.history_days, args.seed)
+    print(f"{args.out_dir}: {result['rows']} rows, {result['channels']} channels, "
+          f"{result['history_points']} history points in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Бенчмарки сборщика и сервера без настоящего API-ключа.
+
+    # полный цикл сбора против локального фейкового API
+    python -m bench.run collector /tmp/bench_collect --regions 104 --pages 4 --latency 0.05
+
+    # роуты server.py на сгенерированных данных (python -m bench.generate_data)
+    python -m bench.run server /tmp/bench_data --repeat 50
+
+--output сохраняет отчёт в JSON, --baseline сравнивает с сохранённым отчётом
+и помечает замедления больше --threshold процентов.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_youtube import FakeYouTube
+from bench.generate_data import working_dir
+
+
+class Timer:
+    """Накопитель длительностей по именам фаз."""
+
+    def __init__(self):
+        self.totals = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - started
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+        return timed
+
+
+def summarize(samples, payload=0):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(total / len(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "rps": round(len(samples) / total, 1) if total else None,
+        "bytes": payload,
+    }
+
+
+def bench_collector(work_dir, regions=None, pages=1, latency=0.0, jitter=0.0, keys=4,
+                    quota_per_key=None, quota_error_rate=0.0, channel_pool=20000,
+                    unavailable=(), rps=None, history_batch=1000, verbose=False):
+    """Полный цикл anuar_yt.run_cycle() против FakeYouTube в work_dir."""
+    with working_dir(work_dir):
+        import anuar_yt
+        from yt_api import KeyPool, TokenBucket
+
+        api = FakeYouTube(pages=pages, latency=latency, jitter=jitter, channel_pool=channel_pool,
+                          quota_per_key=quota_per_key, quota_error_rate=quota_error_rate,
+                          unavailable=unavailable)
+        anuar_yt._key_pool = KeyPool(lambda key: api.build("youtube", "v3", developerKey=key),
+                                     keys=[f"bench-key-{i}" for i in range(keys)],
+                                     usage_file="bench_key_usage.json", daily_quota=10 ** 9,
+                                     rate_limiter=TokenBucket(rps) if rps else anuar_yt.rate_limiter)
+        anuar_yt._channel_stats = None
+        anuar_yt.CHART_PAGES = pages
+        regions = anuar_yt.REGIONS[:regions] if regions else anuar_yt.REGIONS
+
+        timer = Timer()
+        flush = anuar_yt.CycleWriter.flush
+        anuar_yt.CycleWriter.flush = timer.wrap("flush", flush)
+        publish = anuar_yt.publish_snapshot
+        anuar_yt.publish_snapshot = timer.wrap("snapshot", publish)
+        out = sys.stdout if verbose else io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out), timer.phase("cycle"):
+                channels = anuar_yt.run_cycle(regions)
+        finally:
+            anuar_yt.CycleWriter.flush = flush
+            anuar_yt.publish_snapshot = publish
+
+        # Отдельно — запись истории одного региона поканально и одной транзакцией
+        day_rows = [{
+            "channel_id": f"UCbenchhistory{i:010d}",
+            "channel_title": f"history {i}",
+            "subscribers": i, "views_total": i * 10, "videos_total": i % 100,
+            "last_seen": "2000-01-01",
+        } for i in range(history_batch)]
+        with timer.phase("history_per_channel"):
+            for row in day_rows[:history_batch // 10]:
+                anuar_yt.update_channel_history(row)
+        with timer.phase("history_batch"):
+            anuar_yt.history_store.append_many(day_rows)
+
+    calls = api.stats()
+    cycle = timer.totals["cycle"]
+    api_calls = sum(calls["calls"].values())
+    per_channel = timer.totals["history_per_channel"] / max(1, history_batch // 10)
+    return {
+        "regions": len(regions),
+        "channels": channels,
+        "cycle_s": round(cycle, 3),
+        "collect_s": round(cycle - timer.totals.get("flush", 0) - timer.totals.get("snapshot", 0), 3),
+        "flush_s": round(timer.totals.get("flush", 0), 3),
+        "snapshot_s": round(timer.totals.get("snapshot", 0), 3),
+        "api_calls": calls["calls"],
+        "api_errors": calls["errors"],
+        "api_not_modified": calls["not_modified"],
+        "api_calls_per_s": round(api_calls / cycle, 1) if cycle else None,
+        "history_per_channel_ms": round(per_channel * 1000, 3),
+        "history_batch_ms_per_1k": round(timer.totals["history_batch"] / history_batch * 1e6, 3),
+    }
+
+
+def server_cases(sample_id, regions):
+    """regions — два региона, которые есть в данных bench.generate_data."""
+    region = regions[0]
+    return [
+        ("channels_page", "/channels?limit=50"),
+        ("channels_views_offset", "/channels?sort=views&limit=1000&offset=1000"),
+        ("channels_date", "/channels?date=90days&limit=100"),
+        ("channels_subscriber_range", "/channels?min_subscribers=100000&max_subscribers=1000000&limit=100"),
+        ("channels_faceted", f"/channels?region={','.join(regions)}&published_from=2015-01-01"
+                             "&min_views=1000000&max_videos=500&sort=views&limit=100"),
+        ("channels_full", "/channels"),
+        ("channels_full_ndjson", "/channels?format=ndjson"),
+        ("hashtags", "/hashtags?window=7d"),
+        ("hashtags_region", f"/hashtags?region={region}&window=30d"),
+        ("top_growers", "/top_growers?metric=subscribers&window=7d"),
+        ("top_growers_region", f"/top_growers?metric=views&window=30d&region={region}&by=percent"),
+        ("channel_growth", f"/channel_growth/{sample_id}"),
+        ("channel_analytics", f"/channel_analytics/{sample_id}"),
+    ]
+
+
+def bench_server(data_dir, repeat=20):
+    """
+    Каждый роут в трёх режимах: raw — без сжатия, т. е. без кеша ответов
+    (чистая стоимость роута), gzip — сжатый ответ из кеша после первого запроса,
+    not_modified — условный запрос с ETag (304).
+    Ответ с другим статусом (404 вместо данных и т. п.) — ошибка бенчмарка:
+    замер пути ошибки вместо роута ничего не говорит о скорости.
+    """
+    with working_dir(data_dir):
+        from anuar_yt import REGIONS
+        import server
+
+        server.channel_index.refresh(force=True)
+        channels = server.channel_index.channels()
+        if not channels:
+            raise SystemExit(f"{data_dir}: нет *_filtered.json, сначала python -m bench.generate_data")
+        sample_id = channels[len(channels) // 2]["channel_id"]
+        client = server.app.test_client()
+        # Генератор пишет первые BASE_REGIONS регионов anuar_yt.REGIONS
+        regions = [r for r in REGIONS if r in channels.regions()][:2]
+
+        report = {}
+        failures = []
+        for name, url in server_cases(sample_id, regions):
+            modes = {}
+            etag = None
+            for mode, headers in (("raw", {}), ("gzip", {"Accept-Encoding": "gzip"})):
+                samples = []
+                payload = 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    payload = len(response.get_data())
+                    samples.append(time.perf_counter() - started)
+                    etag = response.headers.get("ETag", etag)
+                modes[mode] = summarize(samples, payload)
+                modes[mode]["status"] = response.status_code
+                if response.status_code != 200:
+                    failures.append(f"{name} ({mode}): {response.status_code} {url}")
+            if etag:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+                    samples.append(time.perf_counter() - started)
+                modes["not_modified"] = summarize(samples)
+                if response.status_code != 304:
+                    failures.append(f"{name} (not_modified): {response.status_code} {url}")
+            report[name] = modes
+    if failures:
+        raise SystemExit("Неожиданный статус ответа:\n" + "\n".join(failures))
+    return report
+
+
+def print_report(report, baseline=None, threshold=10.0, prefix=""):
+    """Печатает отчёт; с baseline — изменение относительно него в процентах."""
+    regressions = []
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        base = (baseline or {}).get(key)
+        if isinstance(value, dict) and not {"n", "mean_ms"} <= set(value):
+            regressions += print_report(value, base if isinstance(base, dict) else None,
+                                        threshold, prefix=f"{name}.")
+            continue
+        if isinstance(value, dict):
+            line = (f"{name:<50} mean {value['mean_ms']:>10.3f} ms  p50 {value['p50_ms']:>10.3f}  "
+                    f"p95 {value['p95_ms']:>10.3f}  rps {value['rps'] or 0:>9}  bytes {value['bytes']}")
+            current, previous = value["mean_ms"], (base or {}).get("mean_ms")
+        else:
+            line = f"{name:<50} {value}"
+            current, previous = value, base
+        if (isinstance(current, (int, float)) and isinstance(previous, (int, float))
+                and previous and (key.endswith("_s") or key.endswith("_ms") or isinstance(value, dict))):
+            delta = (current - previous) / previous * 100
+            line += f"  ({delta:+.1f}%)"
+            if delta > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки сборщика и сервера")
+    sub = parser.add_subparsers(dest="target", required=True)
+
+    collector = sub.add_parser("collector", help="цикл сбора против фейкового API")
+    collector.add_argument("work_dir")
+    collector.add_argument("--regions", type=int, default=None, help="первые N регионов (по умолчанию все)")
+    collector.add_argument("--pages", type=int, default=1)
+    collector.add_argument("--latency", type=float, default=0.0, help="задержка запроса, с")
+    collector.add_argument("--jitter", type=float, default=0.0)
+    collector.add_argument("--keys", type=int, default=4)
+    collector.add_argument("--quota-per-key", type=int, default=None)
+    collector.add_argument("--quota-error-rate", type=float, default=0.0)
+    collector.add_argument("--channel-pool", type=int, default=20000)
+    collector.add_argument("--unavailable", default="", help="категории с ответом 404, через запятую")
+    collector.add_argument("--rps", type=float, default=None,
+                           help="лимит запросов в секунду (по умолчанию как в anuar_yt)")
+    collector.add_argument("--verbose", action="store_true")
+
+    srv = sub.add_parser("server", help="роуты server.py на данных из bench.generate_data")
+    srv.add_argument("data_dir")
+    srv.add_argument("--repeat", type=int, default=20)
+
+    for p in (collector, srv):
+        p.add_argument("--output", help="сохранить отчёт в JSON")
+        p.add_argument("--baseline", help="сравнить с отчётом из --output прошлого прогона")
+        p.add_argument("--threshold", type=float, default=10.0, help="порог регрессии, %%")
+    args = parser.parse_args()
+
+    if args.target == "collector":
+        report = bench_collector(
+            args.work_dir, regions=args.regions, pages=args.pages, latency=args.latency,
+            jitter=args.jitter, keys=args.keys, quota_per_key=args.quota_per_key,
+            quota_error_rate=args.quota_error_rate, channel_pool=args.channel_pool,
+            unavailable=[c for c in args.unavailable.split(",") if c], rps=args.rps,
+            verbose=args.verbose)
+    else:
+        report = bench_server(args.data_dir, repeat=args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline, args.threshold)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+from array import array
+from collections.abc import Sequence
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from channel_query import ChannelQuery
+import json_codec
+from metrics import FILE_IO_BYTES, FILE_IO_SECONDS
+from snapshot import NUMERIC_COLUMNS, SNAPSHOT_FILE, SORT_FIELDS, Snapshot
+
+FILTERED_PREFIX = "trending_channels_"
+FILTERED_SUFFIX = "_filtered.json"
+# Как часто (в секундах) проверяем mtime/size файлов регионов
+CHECK_INTERVAL = 5.0
+COLUMNS = NUMERIC_COLUMNS + ("published_ts",)
+# Границы фильтров приводятся к int64 колонок
+_INT64_BOUND = 2 ** 62
+
+
+def stats_version(stats):
+    """{filename: (mtime_ns, size)} -> (отпечаток набора файлов, время изменения в секундах)."""
+    items = sorted((filename, st[0], st[1]) for filename, st in stats.items())
+    fingerprint = hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+    last_modified = max((item[1] for item in items), default=0) / 1e9
+    return fingerprint, last_modified
+
+
+def region_of(filename):
+    """trending_channels_US_filtered.json -> US; None для файлов с другим именем."""
+    if filename.startswith(FILTERED_PREFIX) and filename.endswith(FILTERED_SUFFIX):
+        return filename[len(FILTERED_PREFIX):-len(FILTERED_SUFFIX)] or None
+    return None
+
+
+def _clamp(value):
+    return max(-_INT64_BOUND, min(_INT64_BOUND, value))
+
+
+class ChannelTable(Sequence):
+    """
+    Каналы без дубликатов в колоночном виде. Числовые поля и дата создания —
+    массивы NumPy, строки (channel_id, название, описание, ссылки) остаются
+    в utf-8 таблицах снапшотов: общего снапшота коллектора (mmap, страницы
+    общие для воркеров) или снапшотов отдельных файлов в памяти.
+    ChannelRecord собирается только для строк, которые попали в ответ.
+    Снаружи — неизменяемый список ChannelRecord. Для каждого региона хранятся
+    строки каналов, которые есть в его файле (канал может быть в нескольких).
+    """
+
+    def __init__(self, segments=(), orders=None, regions=None):
+        # segments: [(снапшот, номера его строк)] — строки таблицы идут подряд по сегментам
+        self._segments = list(segments)
+        self._sources = [snap for snap, _ in segments]
+        self._src = np.concatenate(
+            [np.full(len(rows), k, np.uint16) for k, (_, rows) in enumerate(segments)] or
+            [np.zeros(0, np.uint16)])
+        self._rows = np.concatenate([rows for _, rows in segments] or [np.zeros(0, np.uint32)])
+        self._columns = {
+            col: np.concatenate([np.asarray(snap.column(col))[rows] for snap, rows in segments] or
+                                [np.zeros(0, np.int64)])
+            for col in COLUMNS
+        }
+        if orders is None:
+            # Как sorted(..., reverse=True): по убыванию, при равенстве — исходный порядок
+            orders = {field: np.argsort(-self._columns[field], kind="stable") for field in SORT_FIELDS}
+        self._orders = orders
+        # Ключи -value в порядке сортировки — для бинарного поиска диапазонов
+        self._keys = {field: -self._columns[field][order] for field, order in orders.items()}
+        # Код региона -> отсортированные номера строк
+        self._regions = regions or {}
+        self._query = None
+        self._query_lock = threading.Lock()
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        # Сортировки уже посчитаны коллектором
+        orders = {field: np.asarray(snap.order(field)) for field in SORT_FIELDS}
+        regions = {region: np.asarray(rows) for region, rows in snap.regions().items()}
+        return cls([(snap, np.arange(len(snap), dtype=np.uint32))], orders, regions)
+
+    @classmethod
+    def merge(cls, sources):
+        """
+        sources — [(код региона или None, снапшот файла)]. В таблицу попадает
+        первая запись каждого channel_id в порядке снапшотов (файлов регионов).
+        """
+        seen = {}
+        segments = []
+        regions = {}
+        for region, snap in sources:
+            keep = array("I")
+            members = array("I")
+            for row in range(len(snap)):
+                cid = snap.string("channel_id", row)
+                if not cid:
+                    continue
+                table_row = seen.get(cid)
+                if table_row is None:
+                    table_row = seen[cid] = len(seen)
+                    keep.append(row)
+                members.append(table_row)
+            segments.append((snap, np.frombuffer(keep, dtype=np.uint32)))
+            if region:
+                regions[region] = np.unique(np.frombuffer(members, dtype=np.uint32))
+        return cls(segments, regions=regions)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self.records(np.arange(len(self))[i]))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._sources[self._src[i]].row(int(self._rows[i]))
+
+    def __iter__(self):
+        return self.records(np.arange(len(self)))
+
+    def regions(self):
+        """Коды регионов, по которым есть данные."""
+        return sorted(self._regions)
+
+    def region_rows(self, region):
+        """Отсортированные номера строк каналов региона (пусто для неизвестного)."""
+        rows = self._regions.get(region)
+        return np.zeros(0, np.uint32) if rows is None else rows
+
+    def segments(self):
+        """[(снапшот, номера его строк)] в порядке строк таблицы."""
+        return self._segments
+
+    def column(self, name):
+        """Числовая колонка (subscribers, views, videos, published_ts) как массив NumPy."""
+        return self._columns[name]
+
+    def order(self, field):
+        """Номера строк по убыванию field."""
+        return self._orders[field]
+
+    def sort_keys(self, field):
+        """-field в порядке order(field), по возрастанию."""
+        return self._keys[field]
+
+    def query(self):
+        """ChannelQuery таблицы: битмапы и индексы для фильтров, строятся при первом обращении."""
+        if self._query is None:
+            with self._query_lock:
+                if self._query is None:
+                    self._query = ChannelQuery(self)
+        return self._query
+
+    def channel_ids(self, rows):
+        """channel_id строк rows, лениво, без сборки записей целиком."""
+        sources = self._sources
+        for k, row in zip(self._src[rows].tolist(), self._rows[rows].tolist()):
+            yield sources[k].string("channel_id", row)
+
+    def records(self, rows):
+        """ChannelRecord для номеров строк rows, лениво."""
+        sources = self._sources
+        for k, row in zip(self._src[rows].tolist(), self._rows[rows].tolist()):
+            yield sources[k].row(row)
+
+    def find(self, channel_id):
+        if not channel_id:
+            return None
+        # Первый снапшот, где есть channel_id, — тот, чья запись осталась при слиянии
+        for snap in self._sources:
+            row = snap.find(channel_id)
+            if row is not None:
+                return snap.row(row)
+        return None
+
+
+class ChannelIndex:
+    """
+    Общий для процесса индекс каналов из *_filtered.json.
+    Строится один раз, перечитывает только изменившиеся файлы регионов
+    (по mtime и размеру) и хранит каналы без дубликатов по channel_id
+    в ChannelTable. Если снапшот коллектора (snapshot.py) собран из тех же
+    файлов, индекс открывает его через mmap без разбора JSON.
+    """
+
+    def __init__(self, data_dir=".", check_interval=CHECK_INTERVAL, use_snapshot=True,
+                 snapshot_path=None):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self.use_snapshot = use_snapshot
+        self.snapshot_path = snapshot_path or os.path.join(data_dir, SNAPSHOT_FILE)
+        # filename -> (mtime_ns, size, снапшот файла в памяти или None, если загружен из общего снапшота)
+        self._files = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        # (generation, ChannelTable) — заменяется целиком при перестройке
+        self._state = (0, ChannelTable())
+        # (отпечаток набора файлов, время последнего изменения) — одинаковы во всех воркерах
+        self._version = ("", 0.0)
+
+    def _scan(self):
+        stats = {}
+        for filename in os.listdir(self.data_dir):
+            if not filename.endswith(FILTERED_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.data_dir, filename))
+            except OSError:
+                continue
+            stats[filename] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def _load_file(self, filename):
+        path = os.path.join(self.data_dir, filename)
+        try:
+            with FILE_IO_SECONDS.time(target="region", op="read"):
+                with open(path, "rb") as f:
+                    raw = f.read()
+                # Сразу в ChannelRecord (с проверкой полей), затем в колонки снапшота
+                data = Snapshot.from_channels(json_codec.decode(raw))
+            FILE_IO_BYTES.inc(len(raw), target="region", op="read")
+            return data
+        except Exception as e:
+            print(f"Ошибка чтения {filename}: {e}")
+            return None
+
+    def refresh(self, force=False):
+        """Перечитывает изменившиеся файлы. Возвращает True, если индекс перестроен."""
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            # Пока ждали блокировку, проверку мог уже сделать другой поток
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return False
+
+            stats = self._scan()
+            version = stats_version(stats)
+            if version[0] == self._version[0] and not force:
+                self._checked_at = time.monotonic()
+                return False
+
+            changed = self.use_snapshot and self._load_snapshot(stats, version)
+            if not changed:
+                changed = self._load_files(stats)
+                if changed or force:
+                    self._rebuild()
+            self._checked_at = time.monotonic()
+            return changed
+
+    def _load_snapshot(self, stats, version):
+        try:
+            snap = Snapshot(self.snapshot_path)
+        except (OSError, ValueError):
+            return False
+        if snap.source_version != version[0]:
+            snap.close()
+            return False
+        # Снапшот остаётся открытым, пока таблица используется: строки читаются из mmap.
+        # Коллектор заменяет файл через rename, поэтому старое отображение остаётся целым.
+        table = ChannelTable.from_snapshot(snap)
+        self._files = {filename: (st[0], st[1], None) for filename, st in stats.items()}
+        self._version, self._state = version, (self._state[0] + 1, table)
+        return True
+
+    def _load_files(self, stats):
+        changed = False
+        for filename in list(self._files):
+            if filename not in stats:
+                del self._files[filename]
+                changed = True
+
+        for filename, (mtime_ns, size) in stats.items():
+            cached = self._files.get(filename)
+            if cached and cached[2] is not None and cached[0] == mtime_ns and cached[1] == size:
+                continue
+            data = self._load_file(filename)
+            if data is None:
+                # Файл битый или пишется прямо сейчас — оставляем прошлую версию
+                if cached is None or cached[2] is None:
+                    self._files.pop(filename, None)
+                    continue
+                data = cached[2]
+            self._files[filename] = (mtime_ns, size, data)
+            changed = True
+        return changed
+
+    def _rebuild(self):
+        table = ChannelTable.merge((region_of(filename), self._files[filename][2])
+                                   for filename in sorted(self._files))
+        version = stats_version({filename: f[:2] for filename, f in self._files.items()})
+
+        # Таблица и версия подменяются вместе, читатели видят одно поколение
+        self._version, self._state = version, (self._state[0] + 1, table)
+
+    @property
+    def generation(self):
+        self.refresh()
+        return self._state[0]
+
+    def version(self):
+        """(отпечаток данных, время изменения в секундах) — для ETag/Last-Modified."""
+        self.refresh()
+        return self._version
+
+    def channels(self):
+        """Каналы без дубликатов — ChannelTable (общая, изменять нельзя)."""
+        self.refresh()
+        return self._state[1]
+
+    def get(self, channel_id):
+        self.refresh()
+        return self._state[1].find(channel_id)
+
+    def query(self, sort_by="subscribers", offset=0, limit=None, regions=None,
+              published_after=None, published_before=None, ranges=None):
+        """
+        (число каналов под фильтрами, ChannelRecord страницы лениво).
+        Фильтры — см. ChannelQuery.select: regions — коды регионов,
+        published_after/published_before — unix-время включительно,
+        ranges — {subscribers|views|videos: (минимум, максимум)}, None — без границы.
+        """
+        self.refresh()
+        table = self._state[1]
+        if sort_by not in SORT_FIELDS:
+            sort_by = "subscribers"
+        ranges = {col: tuple(None if v is None else _clamp(v) for v in bounds)
+                  for col, bounds in (ranges or {}).items()}
+        if published_after is not None:
+            published_after = _clamp(published_after)
+        if published_before is not None:
+            published_before = _clamp(published_before)
+        rows = table.query().select(sort_by, regions, published_after, published_before, ranges)
+        stop = None if limit is None else offset + limit
+        return len(rows), table.records(rows[offset:stop])
@@ -0,0 +1,160 @@
+"""
+Фасетные запросы к ChannelTable: регионы, диапазон даты создания и диапазоны метрик.
+
+Для таблицы один раз строятся:
+- битмапы регионов (бит на строку таблицы, np.packbits) — при первом запросе региона;
+- индекс даты создания: строки по возрастанию published_ts, диапазон дат —
+  два бинарных поиска и срез;
+- бакетные индексы subscribers/views/videos: строки по возрастанию значения,
+  разбитые на бакеты по порядку величины (0–9, 10–99, 100–999, ...), у каждого
+  бакета свой битмап. Диапазон метрики — OR битмапов бакетов, целиком попавших
+  в диапазон, плюс биты строк из крайних бакетов (срез того же индекса).
+
+Фильтры объединяются AND битмапов, страница берётся из готовой сортировки
+таблицы по итоговой маске — без разбора дат и без проходов по записям.
+"""
+import threading
+
+import numpy as np
+
+from snapshot import NO_DATE, NUMERIC_COLUMNS, SORT_FIELDS
+
+# Границы бакетов метрик: 10, 100, ..., 10**18
+BUCKET_BOUNDS = 10 ** np.arange(1, 19, dtype=np.int64)
+# Крайние строки ставятся в битмап по одной, пока их меньше этой доли таблицы
+_SCATTER_SHARE = 16
+
+
+def empty_bitmap(size):
+    return np.zeros((size + 7) // 8, np.uint8)
+
+
+def set_bits(bits, rows, size):
+    """Ставит биты строк rows в битмап bits (на месте)."""
+    rows = np.asarray(rows, np.int64)
+    if not len(rows):
+        return bits
+    if len(rows) * _SCATTER_SHARE < size:
+        np.bitwise_or.at(bits, rows >> 3, (128 >> (rows & 7)).astype(np.uint8))
+    else:
+        mask = np.zeros(size, bool)
+        mask[rows] = True
+        bits |= np.packbits(mask)
+    return bits
+
+
+def bitmap(rows, size):
+    return set_bits(empty_bitmap(size), rows, size)
+
+
+class RangeIndex:
+    """
+    Строки таблицы по возрастанию значения колонки. С buckets=True — ещё
+    и битмапы бакетов по порядку величины для широких диапазонов.
+    """
+
+    def __init__(self, values, order=None, buckets=True):
+        self.size = len(values)
+        if order is None:
+            order = np.argsort(values, kind="stable")
+        self.order = order
+        self.keys = values[order]
+        self.buckets = []
+        if buckets:
+            # [(начало, конец) в order, битмап] — только непустые бакеты
+            starts = np.r_[0, np.searchsorted(self.keys, BUCKET_BOUNDS), self.size].tolist()
+            for start, stop in zip(starts, starts[1:]):
+                if stop > start:
+                    self.buckets.append((start, stop, bitmap(order[start:stop], self.size)))
+
+    def span(self, low=None, high=None):
+        """Позиции [i, j) в order для low <= value <= high."""
+        i = 0 if low is None else int(np.searchsorted(self.keys, low, "left"))
+        j = self.size if high is None else int(np.searchsorted(self.keys, high, "right"))
+        return i, max(i, j)
+
+    def bitmap(self, low=None, high=None):
+        i, j = self.span(low, high)
+        if not self.buckets:
+            return bitmap(self.order[i:j], self.size)
+        bits = empty_bitmap(self.size)
+        edges = []
+        for start, stop, bucket in self.buckets:
+            if stop <= i or start >= j:
+                continue
+            if i <= start and stop <= j:
+                bits |= bucket
+            else:
+                edges.append(self.order[max(start, i):min(stop, j)])
+        if edges:
+            set_bits(bits, np.concatenate(edges), self.size)
+        return bits
+
+
+class ChannelQuery:
+    """
+    Индексы одной (неизменяемой) ChannelTable. Создаётся таблицей
+    (ChannelTable.query()) и живёт, пока жива она.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.size = len(table)
+        self._lock = threading.Lock()
+        # Код региона -> битмап
+        self._regions = {}
+        published = table.column("published_ts")
+        self.published = RangeIndex(published, buckets=False)
+        # Каналы без корректной даты стоят в начале индекса даты и в диапазоны не попадают
+        self._dated_from = int(np.searchsorted(self.published.keys, NO_DATE, "right"))
+        self.metrics = {}
+        for col in NUMERIC_COLUMNS:
+            order = None
+            if col in SORT_FIELDS:
+                # Готовая сортировка по убыванию, развёрнутая, — тот же набор строк по возрастанию
+                order = table.order(col)[::-1]
+            self.metrics[col] = RangeIndex(table.column(col), order)
+
+    def region_bitmap(self, region):
+        bits = self._regions.get(region)
+        if bits is None:
+            with self._lock:
+                bits = self._regions.get(region)
+                if bits is None:
+                    bits = self._regions[region] = bitmap(self.table.region_rows(region), self.size)
+        return bits
+
+    def published_bitmap(self, after=None, before=None):
+        index = self.published
+        i, j = index.span(after, before)
+        return bitmap(index.order[max(i, self._dated_from):j], self.size)
+
+    def select(self, sort_by="subscribers", regions=None, published_after=None,
+               published_before=None, ranges=None):
+        """
+        Номера строк таблицы в порядке сортировки sort_by (по убыванию),
+        прошедшие все фильтры:
+        regions — коды регионов (канал хотя бы в одном из них),
+        published_after/published_before — границы published_ts включительно,
+        ranges — {метрика: (минимум или None, максимум или None)}.
+        """
+        filters = []
+        if regions:
+            bits = empty_bitmap(self.size)
+            for region in regions:
+                bits |= self.region_bitmap(region)
+            filters.append(bits)
+        if published_after is not None or published_before is not None:
+            filters.append(self.published_bitmap(published_after, published_before))
+        for col, (low, high) in (ranges or {}).items():
+            if low is not None or high is not None:
+                filters.append(self.metrics[col].bitmap(low, high))
+
+        rows = self.table.order(sort_by)
+        if not filters:
+            return rows
+        bits = filters[0]
+        for other in filters[1:]:
+            bits = bits & other
+        mask = np.unpackbits(bits, count=self.size).view(bool)
+        return rows[mask[rows]]
@@ -0,0 +1,198 @@
+"""
+Рейтинг роста каналов для /top_growers по дневной истории из HistoryStore.
+
+Точки daily за последние MAX_WINDOW_DAYS дней хранятся в памяти колонками
+NumPy, отсортированными по (канал, день). Рост канала за окно — разница между
+последней и первой его точкой в окне; топ выбирается частичной сортировкой
+(np.partition) без сортировки всех каналов.
+После цикла сбора из БД дочитываются только точки начиная с последнего
+загруженного дня, посчитанные рейтинги кешируются до следующей записи.
+"""
+import threading
+
+import numpy as np
+
+# Окна считаются в днях от последнего дня, за который есть данные
+WINDOWS = {"7d": 7, "30d": 30, "quarter": 90}
+MAX_WINDOW_DAYS = max(WINDOWS.values())
+METRICS = {"subscribers": "subscribers", "views": "views_total", "videos": "videos_total"}
+RANKINGS = ("absolute", "percent")
+VALUE_COLUMNS = tuple(METRICS.values())
+# Сколько разных рейтингов держать в кеше до следующей записи в историю
+MAX_CACHED_RESULTS = 1024
+
+
+def _days(dates):
+    """'YYYY-MM-DD' -> номер дня от 1970-01-01."""
+    return np.array(dates, dtype="datetime64[D]").astype(np.int32)
+
+
+def _date(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+class GrowthIndex:
+    """
+    Общий для процесса рейтинг роста. channel_index нужен для фильтра
+    по региону: канал в регионе, если он есть в файле региона сейчас.
+    """
+
+    def __init__(self, history_store, channel_index=None):
+        self.history_store = history_store
+        self.channel_index = channel_index
+        self._lock = threading.Lock()
+        self._generation = None
+        # channel_id -> номер канала в колонке channel и обратно
+        self._numbers = {}
+        self._channel_ids = []
+        self._columns = self._empty()
+        # (метрика, окно, регион, ранжирование, limit, поколение индекса каналов) -> строки ответа
+        self._results = {}
+        self._region_masks = {}
+
+    @staticmethod
+    def _empty():
+        columns = {"channel": np.zeros(0, np.int32), "day": np.zeros(0, np.int32)}
+        columns.update((name, np.zeros(0, np.int64)) for name in VALUE_COLUMNS)
+        return columns
+
+    def _read(self, since):
+        """Точки с даты since из БД колонками (без сортировки)."""
+        numbers = self._numbers
+        channel_ids = self._channel_ids
+        channel, dates = [], []
+        values = {name: [] for name in VALUE_COLUMNS}
+        for cid, date, subscribers, views, videos in self.history_store.iter_daily_since(since):
+            number = numbers.get(cid)
+            if number is None:
+                number = numbers[cid] = len(channel_ids)
+                channel_ids.append(cid)
+            channel.append(number)
+            dates.append(date)
+            values["subscribers"].append(subscribers)
+            values["views_total"].append(views)
+            values["videos_total"].append(videos)
+        columns = {"channel": np.array(channel, np.int32), "day": _days(dates)}
+        columns.update((name, np.array(v, np.int64)) for name, v in values.items())
+        return columns
+
+    def _loaded_since(self, start):
+        """Загруженные точки укладываются в БД: число точек с start до последнего дня совпадает."""
+        day = self._columns["day"]
+        if not len(day):
+            return None
+        last = int(day.max())
+        count = int(np.count_nonzero((day >= start) & (day < last)))
+        if self.history_store.count_daily(_date(start), _date(last)) != count:
+            # История за прошлые дни переписана (import_json) — перечитываем всё окно
+            return None
+        return last
+
+    def refresh(self):
+        """Дочитывает новые точки, если история изменилась. Возвращает поколение данных."""
+        generation = self.history_store.version()[0]
+        if generation == self._generation:
+            return generation
+        with self._lock:
+            if generation == self._generation:
+                return generation
+            latest = self.history_store.latest_date()
+            if latest is None:
+                columns = self._empty()
+            else:
+                start = int(_days([latest])[0]) - MAX_WINDOW_DAYS
+                last = self._loaded_since(start)
+                if last is None:
+                    old, since = self._empty(), start
+                else:
+                    # Последний загруженный день мог дописываться — перечитываем его целиком
+                    keep = self._columns["day"] < last
+                    old = {name: column[keep] for name, column in self._columns.items()}
+                    since = last
+                new = self._read(_date(since))
+                columns = {name: np.concatenate((old[name], new[name])) for name in old}
+                keep = columns["day"] >= start
+                order = np.lexsort((columns["day"][keep], columns["channel"][keep]))
+                columns = {name: column[keep][order] for name, column in columns.items()}
+            self._columns = columns
+            self._results = {}
+            self._region_masks = {}
+            self._generation = generation
+            return generation
+
+    def _region_mask(self, region):
+        """Маска по номерам каналов: канал есть в файле региона."""
+        table = self.channel_index.channels()
+        key = (self.channel_index.generation, region, len(self._channel_ids))
+        mask = self._region_masks.get(key)
+        if mask is None:
+            members = set(table.channel_ids(table.region_rows(region)))
+            mask = np.fromiter((cid in members for cid in self._channel_ids), bool,
+                               len(self._channel_ids))
+            self._region_masks[key] = mask
+        return mask
+
+    def top(self, metric="subscribers", window="7d", region=None, limit=100, by="absolute"):
+        """
+        Каналы с наибольшим ростом metric за окно: рост между первой и последней
+        точкой канала в окне, только каналы с ростом больше нуля.
+        by=percent — по росту в процентах от первой точки.
+        """
+        self.refresh()
+        index_generation = self.channel_index.generation if region else None
+        key = (metric, window, region, by, limit, index_generation)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached
+            columns = self._columns
+            channel_ids = self._channel_ids
+            region_mask = self._region_mask(region) if region else None
+
+        day = columns["day"]
+        if not len(day):
+            return []
+        latest = int(day.max())
+        in_window = day >= latest - WINDOWS[window]
+        channel = columns["channel"][in_window]
+        values = columns[METRICS[metric]][in_window]
+        days = day[in_window]
+
+        # Точки отсортированы по (канал, день): первая и последняя точка каждого канала
+        first = np.flatnonzero(np.r_[True, channel[1:] != channel[:-1]])
+        last = np.r_[first[1:] - 1, len(channel) - 1]
+        previous, current = values[first], values[last]
+        change = current - previous
+        percent = np.where(previous != 0, change / np.where(previous != 0, previous, 1) * 100, 0.0)
+        selected = change > 0
+        if region_mask is not None:
+            selected &= region_mask[channel[first]]
+        candidates = np.flatnonzero(selected)
+        rank = (change if by == "absolute" else percent)[candidates]
+
+        # Полная сортировка не нужна: только ключи не ниже limit-го по величине
+        if limit < len(candidates):
+            threshold = np.partition(rank, len(rank) - limit)[len(rank) - limit]
+            keep = rank >= threshold
+            candidates, rank = candidates[keep], rank[keep]
+        # При равном росте — по channel_id, чтобы порядок совпадал во всех воркерах
+        top = sorted(zip((-rank).tolist(), (channel_ids[c] for c in channel[first[candidates]]),
+                         candidates.tolist()))[:limit]
+
+        titles = self.history_store.channel_titles(cid for _, cid, _ in top)
+        result = []
+        for _, cid, i in top:
+            result.append({
+                "channel_id": cid,
+                "channel_title": titles.get(cid),
+                "date_prev": _date(days[first[i]]),
+                "date_curr": _date(days[last[i]]),
+                "previous": int(previous[i]),
+                "current": int(current[i]),
+                "change": int(change[i]),
+                "growth_percent": round(float(percent[i]), 2),
+            })
+        with self._lock:
+            if self._columns is columns and len(self._results) < MAX_CACHED_RESULTS:
+                self._results[key] = result
+        return result
@@ -0,0 +1,124 @@
+import datetime
+import os
+import sqlite3
+import threading
+from history_store import bump_generation, read_version
+
+HASHTAG_DB = "hashtags.db"
+# Окна считаются в днях от последнего дня, за который есть данные
+WINDOWS = {"24h": 1, "7d": 7, "30d": 30}
+RETENTION_DAYS = int(os.environ.get("HASHTAG_RETENTION_DAYS", "90"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashtag_counts (
+    day    TEXT NOT NULL,
+    region TEXT NOT NULL,
+    tag    TEXT NOT NULL,
+    videos INTEGER NOT NULL,
+    PRIMARY KEY (day, region, tag)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS region_videos (
+    day    TEXT NOT NULL,
+    region TEXT NOT NULL,
+    videos INTEGER NOT NULL,
+    PRIMARY KEY (day, region)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class HashtagStore:
+    """
+    Счётчики хэштегов по регионам и дням в SQLite.
+    Для каждого (день, регион, тег) хранится число трендовых видео с тегом,
+    для (день, регион) — общее число видео; popularity = доля видео с тегом
+    в выбранном регионе (или во всех) за окно 24h/7d/30d.
+    """
+
+    def __init__(self, path=HASHTAG_DB):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('updated_at', 0)")
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            # После fork (воркеры gunicorn) соединения родителя не используем
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_counts(self, samples):
+        """
+        samples: [(day, region, videos, {тег: видео с тегом}), ...]
+        Всё пишется одной транзакцией; повторные прогоны за день суммируются.
+        """
+        counts_rows, videos_rows = [], []
+        for day, region, videos, counter in samples:
+            videos_rows.append((day, region, videos))
+            counts_rows.extend((day, region, tag, n) for tag, n in counter.items())
+
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO region_videos VALUES (?, ?, ?) "
+                "ON CONFLICT (day, region) DO UPDATE SET videos = videos + excluded.videos",
+                videos_rows)
+            conn.executemany(
+                "INSERT INTO hashtag_counts VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (day, region, tag) DO UPDATE SET videos = videos + excluded.videos",
+                counts_rows)
+            latest = conn.execute("SELECT MAX(day) FROM region_videos").fetchone()[0]
+            if latest:
+                cutoff = (datetime.date.fromisoformat(latest)
+                          - datetime.timedelta(days=RETENTION_DAYS)).isoformat()
+                conn.execute("DELETE FROM hashtag_counts WHERE day < ?", (cutoff,))
+                conn.execute("DELETE FROM region_videos WHERE day < ?", (cutoff,))
+            bump_generation(conn)
+
+    def version(self):
+        """(generation, updated_at) — общие для всех процессов, для ETag/Last-Modified."""
+        return read_version(self._conn())
+
+    def top(self, region=None, window="24h", limit=100):
+        """Топ тегов за окно, по убыванию popularity."""
+        conn = self._conn()
+        latest = conn.execute("SELECT MAX(day) FROM region_videos").fetchone()[0]
+        if latest is None:
+            return []
+        since = (datetime.date.fromisoformat(latest)
+                 - datetime.timedelta(days=WINDOWS[window] - 1)).isoformat()
+
+        where, params = "day >= ?", [since]
+        if region:
+            where += " AND region = ?"
+            params.append(region)
+
+        total = conn.execute(
+            f"SELECT SUM(videos) FROM region_videos WHERE {where}", params).fetchone()[0]
+        if not total:
+            return []
+
+        sql = (f"SELECT tag, SUM(videos) AS n FROM hashtag_counts WHERE {where} "
+               "GROUP BY tag ORDER BY n DESC, tag")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [
+            {"tag": tag, "popularity": round(n / total * 100, 2), "count": n}
+            for tag, n in conn.execute(sql, params)
+        ]
@@ -0,0 +1,282 @@
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+HISTORY_DB = "channels_history.db"
+HISTORY_DIR = "channels_history"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id    TEXT PRIMARY KEY,
+    channel_title TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily (
+    channel_id   TEXT NOT NULL,
+    date         TEXT NOT NULL,
+    subscribers  INTEGER NOT NULL,
+    views_total  INTEGER NOT NULL,
+    videos_total INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, date)
+) WITHOUT ROWID;
+
+-- Чтение точек всех каналов начиная с даты (рейтинг роста, growth_index.py)
+CREATE INDEX IF NOT EXISTS daily_date ON daily (date);
+
+CREATE TABLE IF NOT EXISTS monthly (
+    channel_id        TEXT NOT NULL,
+    month             TEXT NOT NULL,
+    subscribers_start INTEGER NOT NULL,
+    subscribers_end   INTEGER NOT NULL,
+    views_start       INTEGER NOT NULL,
+    views_total       INTEGER NOT NULL,
+    videos_start      INTEGER NOT NULL,
+    videos_total      INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, month)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS quarterly (
+    channel_id        TEXT NOT NULL,
+    quarter           TEXT NOT NULL,
+    subscribers_start INTEGER NOT NULL,
+    subscribers_end   INTEGER NOT NULL,
+    views_start       INTEGER NOT NULL,
+    views_total       INTEGER NOT NULL,
+    videos_start      INTEGER NOT NULL,
+    videos_total      INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, quarter)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Периодические записи: при первом появлении периода фиксируются стартовые значения,
+# дальше обновляются только конечные
+PERIOD_UPSERT = """
+INSERT INTO {table} (channel_id, {period}, subscribers_start, subscribers_end,
+                     views_start, views_total, videos_start, videos_total)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (channel_id, {period}) DO UPDATE SET
+    subscribers_end = excluded.subscribers_end,
+    views_total = excluded.views_total,
+    videos_total = excluded.videos_total
+"""
+
+
+def bump_generation(conn):
+    """Отмечает запись в meta: generation + 1 и время изменения."""
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+    conn.execute("UPDATE meta SET value = ? WHERE key = 'updated_at'", (int(time.time()),))
+
+
+def read_version(conn):
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    return meta.get("generation", 0), meta.get("updated_at", 0)
+
+
+class HistoryStore:
+    """
+    История каналов (daily/monthly/quarterly) в SQLite вместо JSON-файла на канал.
+    Соединение своё у каждого потока, запись региона — одна транзакция.
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('updated_at', 0)")
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            # После fork (воркеры gunicorn) соединения родителя не используем
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_many(self, channels):
+        """Добавляет точки истории для списка каналов одной транзакцией."""
+        channels_rows, daily_rows, monthly_rows, quarterly_rows = [], [], [], []
+        for ch in channels:
+            if "subscribers" not in ch:
+                # Канал без статистики (не вернулся из channels.list)
+                continue
+            cid = ch["channel_id"]
+            today = datetime.date.fromisoformat(ch["last_seen"])
+            month = today.strftime("%Y-%m")
+            quarter = f"{today.year}-Q{(today.month-1)//3+1}"
+            subs, views, videos = ch["subscribers"], ch["views_total"], ch["videos_total"]
+
+            channels_rows.append((cid, ch.get("channel_title")))
+            daily_rows.append((cid, ch["last_seen"], subs, views, videos))
+            monthly_rows.append((cid, month, subs, subs, views, views, videos, videos))
+            quarterly_rows.append((cid, quarter, subs, subs, views, views, videos, videos))
+
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO channels VALUES (?, ?)", channels_rows)
+            # Первая точка за день остаётся, повторный запуск в тот же день её не меняет
+            conn.executemany("INSERT OR IGNORE INTO daily VALUES (?, ?, ?, ?, ?)", daily_rows)
+            conn.executemany(PERIOD_UPSERT.format(table="monthly", period="month"), monthly_rows)
+            conn.executemany(PERIOD_UPSERT.format(table="quarterly", period="quarter"), quarterly_rows)
+            bump_generation(conn)
+        return len(daily_rows)
+
+    def version(self):
+        """(generation, updated_at) из БД — общие для всех процессов, для ETag/Last-Modified."""
+        return read_version(self._conn())
+
+    def has_channel(self, channel_id):
+        row = self._conn().execute(
+            "SELECT 1 FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row is not None
+
+    def get_daily(self, channel_id, since=None, until=None):
+        """
+        (channel_title, дневные точки за [since, until]) по первичному ключу
+        (channel_id, date) — без чтения истории других каналов. None, если канала нет.
+        """
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT channel_title FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        if row is None:
+            return None
+        points = [
+            {"date": d, "subscribers": s, "views_total": v, "videos_total": n}
+            for d, s, v, n in conn.execute(
+                "SELECT date, subscribers, views_total, videos_total FROM daily "
+                "WHERE channel_id = ? AND date >= ? AND date <= ? ORDER BY date",
+                (channel_id, since or "", until or "9999-12-31"))
+        ]
+        return row[0], points
+
+    def latest_date(self):
+        """Последний день, за который есть точки, или None."""
+        return self._conn().execute("SELECT MAX(date) FROM daily").fetchone()[0]
+
+    def iter_daily_since(self, since):
+        """(channel_id, date, subscribers, views_total, videos_total) всех каналов с даты since."""
+        return self._conn().execute(
+            "SELECT channel_id, date, subscribers, views_total, videos_total FROM daily "
+            "WHERE date >= ?", (since,))
+
+    def count_daily(self, since, until):
+        """Число точек с датой в [since, until)."""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM daily WHERE date >= ? AND date < ?", (since, until)).fetchone()[0]
+
+    def channel_titles(self, channel_ids):
+        """{channel_id: channel_title} для списка каналов."""
+        channel_ids = list(channel_ids)
+        titles = {}
+        conn = self._conn()
+        # Не больше 500 параметров в одном запросе (лимит SQLite на старых сборках — 999)
+        for i in range(0, len(channel_ids), 500):
+            chunk = channel_ids[i:i + 500]
+            titles.update(conn.execute(
+                "SELECT channel_id, channel_title FROM channels WHERE channel_id IN "
+                f"({','.join('?' * len(chunk))})", chunk))
+        return titles
+
+    def get_history(self, channel_id):
+        """История канала в формате прежних channels_history/<id>.json или None."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT channel_title FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        if row is None:
+            return None
+
+        daily = [
+            {"date": d, "subscribers": s, "views_total": v, "videos_total": n}
+            for d, s, v, n in conn.execute(
+                "SELECT date, subscribers, views_total, videos_total FROM daily "
+                "WHERE channel_id = ? ORDER BY date", (channel_id,))
+        ]
+
+        def periods(table, period):
+            return [
+                {
+                    period: p,
+                    "subscribers_start": ss,
+                    "subscribers_end": se,
+                    "subscribers_growth": se - ss,
+                    "views_start": vs,
+                    "views_total": vt,
+                    "views_growth": vt - vs,
+                    "videos_start": ns,
+                    "videos_total": nt,
+                    "videos_added": nt - ns
+                }
+                for p, ss, se, vs, vt, ns, nt in conn.execute(
+                    f"SELECT {period}, subscribers_start, subscribers_end, views_start, "
+                    f"views_total, videos_start, videos_total FROM {table} "
+                    f"WHERE channel_id = ? ORDER BY {period}", (channel_id,))
+            ]
+
+        return {
+            "channel_id": channel_id,
+            "channel_title": row[0],
+            "history": {
+                "daily": daily,
+                "monthly": periods("monthly", "month"),
+                "quarterly": periods("quarterly", "quarter")
+            }
+        }
+
+    def import_json(self, data):
+        """Импорт одной истории в формате channels_history/<id>.json (с заменой)."""
+        cid = data["channel_id"]
+        history = data.get("history", {})
+        period_cols = ("subscribers_start", "subscribers_end", "views_start",
+                       "views_total", "videos_start", "videos_total")
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO channels VALUES (?, ?)",
+                         (cid, data.get("channel_title")))
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?, ?)",
+                [(cid, d["date"], d["subscribers"], d["views_total"], d["videos_total"])
+                 for d in history.get("daily", [])])
+            for table, period in (("monthly", "month"), ("quarterly", "quarter")):
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cid, r[period], *(r[c] for c in period_cols))
+                     for r in history.get(table, [])])
+            bump_generation(conn)
+
+
+def migrate(json_dir=HISTORY_DIR, db_path=HISTORY_DB):
+    """Переносит channels_history/*.json в SQLite."""
+    store = HistoryStore(db_path)
+    imported = 0
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+                store.import_json(json.load(f))
+            imported += 1
+        except Exception as e:
+            print(f"Failed to import {filename}: {e}")
+    print(f"Imported {imported} channel histories into {db_path}")
+    return imported
+
+
+if __name__ == "__main__":
+    # python history_store.py [channels_history] [channels_history.db]
+    migrate(*sys.argv[1:3])
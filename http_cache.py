@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+import zlib
+from flask import Response, make_response, request
+from metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаём gzip
+    brotli = None
+
+# Общий объём сжатых ответов в кеше
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Для скольких ETag помнить заголовки представления (для 304 без тела в кеше)
+HEADERS_MAX_ENTRIES = 16384
+# Заголовки ответа, которые не переносятся в кешированный сжатый ответ:
+# описывают несжатое тело, hop-by-hop или выставляются кешем заново
+SKIP_HEADERS = frozenset((
+    "content-type", "content-length", "content-encoding", "content-md5", "transfer-encoding",
+    "connection", "keep-alive", "te", "trailer", "upgrade", "proxy-authenticate",
+    "proxy-authorization", "etag", "last-modified", "vary", "cache-control",
+))
+
+
+def negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(chunks, encoding):
+    """Сжимает тело ответа по кускам, не собирая несжатый ответ целиком."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        out = [compressor.process(chunk) for chunk in chunks]
+        out.append(compressor.finish())
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — формат gzip
+        out = [compressor.compress(chunk) for chunk in chunks]
+        out.append(compressor.flush())
+    return b"".join(out)
+
+
+class ResponseCache:
+    """
+    HTTP-кеширование ответов API: сильный ETag от версии данных и запроса,
+    Last-Modified, 304 на If-None-Match/If-Modified-Since и gzip/br-сжатие
+    со сжатыми байтами в LRU-кеше по ключу запроса.
+    304 отдаётся только для запроса, на который уже был ответ 200, вместе
+    с его заголовками представления (X-Total-Count и т. п.). Если в этом
+    процессе такого ответа ещё не было, view выполняется, и 304 отдаётся,
+    только если она вернула 200.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_headers=HEADERS_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_headers = max_headers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        # ETag без кодировки -> заголовки представления ответа 200
+        self._headers = OrderedDict()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _get_headers(self, base):
+        with self._lock:
+            headers = self._headers.get(base)
+            if headers is not None:
+                self._headers.move_to_end(base)
+            return headers
+
+    def _put_headers(self, base, headers):
+        with self._lock:
+            self._headers[base] = headers
+            self._headers.move_to_end(base)
+            while len(self._headers) > self.max_headers:
+                self._headers.popitem(last=False)
+
+    def _put(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0])
+
+    def cached(self, version_fn):
+        """
+        version_fn() -> (версия данных, время изменения в секундах).
+        Версия должна совпадать во всех воркерах для одних и тех же данных.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                version, last_modified = version_fn()
+                query = sorted(request.args.items(multi=True))
+                base = hashlib.sha1(repr((version, request.path, query)).encode("utf-8")).hexdigest()
+                encoding = negotiate_encoding()
+                etag = f"{base}-{encoding}" if encoding else base
+
+                def finish(response):
+                    response.set_etag(etag)
+                    if last_modified:
+                        response.last_modified = last_modified
+                    response.vary.add("Accept-Encoding")
+                    response.cache_control.no_cache = True
+                    return response
+
+                def not_modified(headers):
+                    CACHE_REQUESTS.inc(cache="response", result="not_modified")
+                    return finish(Response(status=304, headers=headers))
+
+                conditional = False
+                if request.if_none_match:
+                    conditional = request.if_none_match.contains(etag)
+                elif last_modified and request.if_modified_since:
+                    conditional = int(last_modified) <= request.if_modified_since.timestamp()
+                if conditional:
+                    headers = self._get_headers(base)
+                    if headers is not None:
+                        return not_modified(headers)
+
+                if encoding:
+                    entry = self._get((etag, encoding))
+                    if entry is not None:
+                        CACHE_REQUESTS.inc(cache="response", result="hit")
+                        body, mimetype, headers = entry
+                        return finish(Response(body, mimetype=mimetype, headers=headers))
+                # Без сжатия ответ отдаётся потоком и не кешируется
+                CACHE_REQUESTS.inc(cache="response", result="miss" if encoding else "bypass")
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                headers = [(name, value) for name, value in response.headers
+                           if name.lower() not in SKIP_HEADERS]
+                self._put_headers(base, headers)
+                if conditional:
+                    # Ответ 200 подтвердился, тело клиенту не нужно
+                    response.close()
+                    return not_modified(headers)
+                if not encoding:
+                    return finish(response)
+
+                body = compress(response.iter_encoded(), encoding)
+                headers = headers + [("Content-Encoding", encoding)]
+                self._put((etag, encoding), (body, response.mimetype, headers))
+                return finish(Response(body, mimetype=response.mimetype, headers=headers))
+            return wrapper
+        return decorator
@@ -0,0 +1,135 @@
+"""
+JSON для сборщика и сервера: orjson или msgspec, если установлены, иначе stdlib json.
+Оба необязательны и не входят в requirements.txt: pip install orjson (или msgspec).
+Бэкенд можно зафиксировать переменной JSON_CODEC=orjson|msgspec|json.
+
+dumps() всегда отдаёт UTF-8 байты; по умолчанию компактно, pretty=True — с отступами.
+decode() разбирает список записей сразу в типизированные ChannelRecord.
+"""
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Optional
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec необязателен
+    msgspec = None
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _pick_backend():
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    requested = os.environ.get("JSON_CODEC")
+    if requested:
+        if not available.get(requested):
+            raise ValueError(f"JSON_CODEC={requested}: бэкенд не установлен или неизвестен")
+        return requested
+    return next(name for name in BACKENDS if available[name])
+
+
+BACKEND = _pick_backend()
+
+
+@dataclass(slots=True)
+class ChannelRecord:
+    """
+    Запись *_filtered.json. Поля в алфавитном порядке — так же, как ключи
+    в ответах API (sort_keys), поэтому запись сериализуется без сортировки.
+    Читается и как dict: record["title"], record.get("views", 0).
+    """
+    channel_id: str
+    channel_url: Optional[str] = None
+    description: Optional[str] = None
+    published_at: Optional[str] = None
+    subscribers: int = 0
+    thumbnail: Optional[str] = None
+    title: Optional[str] = None
+    videos: int = 0
+    views: int = 0
+
+    def __getitem__(self, key):
+        if key not in CHANNEL_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in CHANNEL_FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in CHANNEL_FIELDS else default
+
+    def keys(self):
+        return CHANNEL_FIELDS
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in CHANNEL_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in CHANNEL_FIELDS if name in data})
+
+
+CHANNEL_FIELDS = tuple(f.name for f in fields(ChannelRecord))
+
+
+def _default(obj):
+    if is_dataclass(obj):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if BACKEND == "orjson":
+    def dumps(obj, pretty=False, sort_keys=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def decode(data, record_type=ChannelRecord):
+        return [record_type.from_dict(row) for row in orjson.loads(data)]
+
+elif BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _sorted_encoder = msgspec.json.Encoder(enc_hook=_default, order="sorted")
+    _decoders = {}
+
+    def dumps(obj, pretty=False, sort_keys=False):
+        data = (_sorted_encoder if sort_keys else _encoder).encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def loads(data):
+        return msgspec.json.decode(data)
+
+    def decode(data, record_type=ChannelRecord):
+        # msgspec разбирает JSON сразу в dataclass, без промежуточных dict
+        decoder = _decoders.get(record_type)
+        if decoder is None:
+            decoder = _decoders[record_type] = msgspec.json.Decoder(list[record_type])
+        return decoder.decode(data)
+
+else:
+    def dumps(obj, pretty=False, sort_keys=False):
+        if pretty:
+            text = json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys, default=_default)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"),
+                              sort_keys=sort_keys, default=_default)
+        return text.encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+    def decode(data, record_type=ChannelRecord):
+        return [record_type.from_dict(row) for row in json.loads(data)]
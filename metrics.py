@@ -0,0 +1,324 @@
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Счётчики и гистограммы живут в памяти процесса: сервер отдаёт их на /metrics,
+сборщик пишет их в файл в конце цикла (формат textfile-коллектора node_exporter).
+
+Под gunicorn (serve.py) каждый воркер раз в FLUSH_INTERVAL секунд сбрасывает
+свои значения в файл общего каталога (enable_multiprocess), а /metrics
+складывает файлы всех воркеров: счётчики и гистограммы суммируются (файлы
+завершившихся воркеров тоже — суммы не убывают), gauge берётся из самого
+свежего файла живого процесса. Значения других воркеров отстают от текущих
+не больше чем на FLUSH_INTERVAL.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import atexit
+import json
+import os
+import threading
+import time
+
+# Секунды: от быстрых роутов до медленных запросов к API
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Байты: от ответа с ошибкой до полного /channels
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+# Как часто воркер сбрасывает метрики в каталог enable_multiprocess()
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+FILE_PREFIX = "metrics_"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+    def _state(self):
+        """Значения в виде для JSON: [[значения меток, значение], ...]."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _merge(self, key, value):
+        """Добавляет значение из файла другого процесса."""
+        self._values[key] = self._values.get(key, 0) + value
+
+    def _spec(self):
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels)}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _merge(self, key, value):
+        # Файлы перебираются от старых к новым — остаётся самое свежее значение
+        self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [счётчики по бакетам (+Inf последним), сумма, число]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _state(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, count]]
+                    for key, (counts, total, count) in self._values.items()]
+
+    def _merge(self, key, value):
+        state = self._values.get(key)
+        if state is None:
+            self._values[key] = [list(value[0]), value[1], value[2]]
+            return
+        state[0] = [a + b for a, b in zip(state[0], value[0])]
+        state[1] += value[1]
+        state[2] += value[2]
+
+    def _spec(self):
+        return dict(super()._spec(), buckets=list(self.buckets))
+
+    def _render_items(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_labels(self.labels, key, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Обнуляет значения всех метрик (воркер после fork не должен повторять значения мастера)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                metric._values.clear()
+
+    def flush(self, directory):
+        """Записывает значения процесса в directory/metrics_<pid>.json (атомарно)."""
+        from storage import atomic_write_text
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {m.name: dict(m._spec(), values=m._state()) for m in metrics}
+        atomic_write_text(os.path.join(directory, f"{FILE_PREFIX}{os.getpid()}.json"), json.dumps(data))
+
+    def render_directory(self, directory):
+        """Сумма метрик всех процессов из файлов directory (свои значения сбрасываются первыми)."""
+        self.flush(directory)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith(FILE_PREFIX) and entry.name.endswith(".json"):
+                pid = int(entry.name[len(FILE_PREFIX):-len(".json")])
+                files.append((entry.stat().st_mtime, pid, entry.path))
+        merged = {}
+        for _, pid, path in sorted(files):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _alive(pid)
+            for name, spec in data.items():
+                cls = _KINDS[spec["kind"]]
+                if cls is Gauge and not alive:
+                    continue
+                metric = merged.get(name)
+                if metric is None:
+                    kwargs = {"buckets": spec["buckets"]} if cls is Histogram else {}
+                    metric = merged[name] = cls(name, spec["help"], spec["labels"], **kwargs)
+                for key, value in spec["values"]:
+                    metric._merge(tuple(key), value)
+        lines = []
+        for name in sorted(merged):
+            lines.extend(merged[name].render())
+        return "\n".join(lines) + "\n"
+
+
+_KINDS = {cls.kind: cls for cls in (Counter, Gauge, Histogram)}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+# Каталог метрик процессов gunicorn; None — /metrics отдаёт метрики своего процесса
+_directory = None
+
+
+def render():
+    """Текст для /metrics: свои метрики или сумма по процессам из enable_multiprocess()."""
+    if _directory is None:
+        return REGISTRY.render()
+    return REGISTRY.render_directory(_directory)
+
+
+def enable_multiprocess(directory):
+    """
+    Вызывается в мастере gunicorn до fork: очищает каталог от файлов прошлого
+    запуска и записывает значения мастера (например, построение индексов в preload).
+    """
+    global _directory
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.scandir(directory):
+        if entry.name.startswith(FILE_PREFIX) and entry.name.endswith(".json"):
+            os.unlink(entry.path)
+    _directory = directory
+    REGISTRY.flush(directory)
+
+
+def start_worker(interval=FLUSH_INTERVAL):
+    """
+    Вызывается в воркере после fork: значения мастера уже учтены в его файле,
+    дальше воркер считает с нуля и сбрасывает свои значения в фоне.
+    """
+    if _directory is None:
+        return
+    REGISTRY.reset()
+
+    def flush_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                REGISTRY.flush(_directory)
+            except OSError as e:
+                print(f"Не удалось сбросить метрики: {e}")
+
+    threading.Thread(target=flush_loop, name="metrics-flush", daemon=True).start()
+    atexit.register(REGISTRY.flush, _directory)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Общие для сборщика и сервера метрики
+CACHE_REQUESTS = counter("cache_requests_total", "Обращения к кешам по результату",
+                         ("cache", "result"))
+FILE_IO_SECONDS = histogram("file_io_seconds", "Время чтения и записи файлов данных",
+                            ("target", "op"))
+FILE_IO_BYTES = counter("file_io_bytes_total", "Байт прочитано и записано в файлы данных",
+                        ("target", "op"))
+STORE_ROWS = counter("store_rows_written_total", "Строк записано в SQLite-хранилища", ("target",))
+
+
+def dump(path):
+    """Записывает все метрики процесса в файл (атомарно)."""
+    from storage import atomic_write_text
+    atomic_write_text(path, REGISTRY.render())
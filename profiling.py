@@ -0,0 +1,170 @@
+"""
+Профилирование отдельных запросов server.py по требованию.
+
+Включается переменной окружения WEB_PROFILE=1; без неё хуки не регистрируются
+и запросы не проходят ни через какой дополнительный код. Запрос профилируется,
+если у него есть заголовок X-Profile или параметр _profile со значением —
+долей запросов, которые нужно снять (1 — каждый, 0.1 — каждый десятый):
+
+    curl -H "X-Profile: 1" "http://host:5000/channels?limit=1000"
+
+Трасса cProfile сохраняется в WEB_PROFILE_DIR как .pstats (snakeviz,
+flameprof, python -m pstats), имя файла возвращается в X-Profile-Trace.
+Список трасс — /profiles, файл — /profiles/<name>, сводка — /profiles/<name>?format=text.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from flask import Response, g, jsonify, request, send_from_directory
+
+PROFILE_ENABLED = os.environ.get("WEB_PROFILE") == "1"
+PROFILE_DIR = os.environ.get("WEB_PROFILE_DIR", "profiles")
+# Сколько последних трасс хранить на диске
+PROFILE_KEEP = int(os.environ.get("WEB_PROFILE_KEEP", "200"))
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAM = "_profile"
+
+# cProfile нельзя запустить в двух потоках одновременно — лишние запросы не профилируются
+_active = threading.Lock()
+
+
+def sample_rate(value):
+    """Значение X-Profile/_profile -> доля запросов; пустое значение — каждый запрос."""
+    if value in ("", "1", "true", "yes"):
+        return 1.0
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except ValueError:
+        return 0.0
+
+
+def trace_name(route, elapsed=None):
+    """Имя файла трассы; elapsed=None — потоковый ответ, длительность ещё неизвестна."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    duration = "stream" if elapsed is None else f"{elapsed * 1000:.0f}ms"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}_{slug}_{duration}_{os.getpid()}.pstats"
+
+
+def _cleanup():
+    traces = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".pstats")),
+        key=lambda entry: entry.stat().st_mtime)
+    for entry in traces[:-PROFILE_KEEP]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _save(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+    _cleanup()
+    return name
+
+
+def _start_profile():
+    value = request.headers.get(PROFILE_HEADER)
+    if value is None:
+        value = request.args.get(PROFILE_PARAM)
+    if value is None or random.random() >= sample_rate(value):
+        return
+    if not _active.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    g.profile = (profiler, time.perf_counter())
+    profiler.enable()
+
+
+def _finish_profile(response):
+    state = g.pop("profile", None)
+    if state is None:
+        return response
+    profiler, started = state
+    route = request.url_rule.rule if request.url_rule else request.path
+
+    def finish(name):
+        profiler.disable()
+        try:
+            return _save(profiler, name)
+        finally:
+            _active.release()
+
+    if not response.is_streamed:
+        response.headers["X-Profile-Trace"] = finish(trace_name(route, time.perf_counter() - started))
+        return response
+
+    # Потоковый ответ: сериализация идёт после after_request — профилируем до последнего куска.
+    # Имя трассы известно заранее, файл появляется после отдачи тела
+    body = response.response
+    name = trace_name(route)
+
+    def profiled():
+        try:
+            yield from body
+        finally:
+            finish(name)
+    response.response = profiled()
+    response.headers["X-Profile-Trace"] = name
+    return response
+
+
+def _abort_profile(exc=None):
+    # after_request не вызывался (ошибка до ответа) — не оставляем профайлер включённым
+    state = g.pop("profile", None)
+    if state is not None:
+        state[0].disable()
+        _active.release()
+
+
+def list_profiles():
+    """Последние трассы, новые первыми."""
+    if not os.path.isdir(PROFILE_DIR):
+        return jsonify([])
+    traces = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".pstats"):
+            st = entry.stat()
+            traces.append({
+                "name": entry.name,
+                "created_at": int(st.st_mtime),
+                "size": st.st_size,
+                "url": f"/profiles/{entry.name}",
+            })
+    traces.sort(key=lambda t: (t["created_at"], t["name"]), reverse=True)
+    return jsonify(traces)
+
+
+def get_profile(name):
+    """Файл трассы или текстовая сводка (?format=text&sort=cumulative&limit=40)."""
+    if not name.endswith(".pstats") or not os.path.isfile(os.path.join(PROFILE_DIR, name)):
+        return jsonify({"error": "Трасса не найдена"}), 404
+    if request.args.get("format") != "text":
+        return send_from_directory(os.path.abspath(PROFILE_DIR), name,
+                                   mimetype="application/octet-stream", as_attachment=True)
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(PROFILE_DIR, name), stream=out)
+    sort = request.args.get("sort", "cumulative")
+    try:
+        limit = int(request.args.get("limit", "40"))
+        stats.sort_stats(sort).print_stats(limit)
+    except (KeyError, ValueError):
+        return jsonify({"error": "Некорректные параметры sort/limit"}), 400
+    return Response(out.getvalue(), mimetype="text/plain")
+
+
+def init_app(app):
+    """Регистрирует хуки и роуты профилирования, если оно включено в окружении."""
+    if not PROFILE_ENABLED:
+        return False
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abort_profile)
+    app.add_url_rule("/profiles", "list_profiles", list_profiles, methods=["GET"])
+    app.add_url_rule("/profiles/<name>", "get_profile", get_profile, methods=["GET"])
+    return True
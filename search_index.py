@@ -0,0 +1,268 @@
+"""
+Полнотекстовый поиск каналов для /search по названию и описанию.
+
+Текст нормализуется (NFKC, casefold, арабские огласовки и формы алифа, ё -> е)
+и режется на слова; тайские и деванагари-знаки над/под буквами остаются
+частью слова. Для слов названия и описания строятся отсортированные словари
+с posting-списками (offsets + номера строк), поэтому слова с общим префиксом
+лежат подряд и поиск по префиксу — один срез массива. По словам названия
+дополнительно есть индекс триграмм — поиск подстроки внутри слова (тайский
+пишется без пробелов).
+
+Индекс состоит из сегментов — по одному на снапшот ChannelTable (общий
+снапшот коллектора или файл региона). Сегмент неизменяемый и переиспользуется,
+пока его снапшот в таблице: после изменения файлов региона заново
+индексируются только они.
+"""
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+import os
+import re
+import sys
+import threading
+import unicodedata
+import weakref
+
+import numpy as np
+
+import metrics
+
+# Сколько символов описания индексировать — хвосты описаний в основном ссылки и теги
+DESCRIPTION_CHARS = int(os.environ.get("SEARCH_DESCRIPTION_CHARS", "1000"))
+# Длиннее обрезаем: слитный тайский текст даёт «слова» на целое предложение
+MAX_WORD = 32
+MAX_QUERY_WORDS = 8
+# По префиксу ищутся слова запроса от стольких символов, по подстроке — от трёх
+MIN_PREFIX = 2
+
+# Веса совпадения одного слова запроса; у канала берётся лучшее по каждому слову
+TITLE_EXACT = 4.0
+TITLE_PREFIX = 3.0
+TITLE_SUBSTRING = 2.0
+DESCRIPTION_EXACT = 1.0
+DESCRIPTION_PREFIX = 0.5
+
+SEGMENT_BUILD_SECONDS = metrics.histogram("search_segment_build_seconds",
+                                          "Время построения сегмента поискового индекса")
+
+# Огласовки (харакат), надстрочный алиф и татвиль в арабском пишут непоследовательно,
+# как и хамзу над/под алифом (أ إ آ -> ا) и точки под конечной я (ى -> ي)
+_ARABIC_MARKS = re.compile("[\u064b-\u065f\u0670\u0640]")
+_ARABIC_ALEF = re.compile("[\u0622\u0623\u0625]")
+
+
+def _marks():
+    # \w в re не включает комбинирующие знаки (тайские гласные и тоны) — добавляем их классом
+    ranges = []
+    for code in range(0x300, 0x10000):
+        if unicodedata.category(chr(code)) in ("Mn", "Mc"):
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return "".join(f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges)
+
+
+_WORD = re.compile(rf"[\w{_marks()}]+")
+
+
+def fold(text):
+    """Нормализованный текст для сравнения: регистр, совместимые формы, огласовки."""
+    text = _ARABIC_MARKS.sub("", unicodedata.normalize("NFKC", text).casefold())
+    return _ARABIC_ALEF.sub("\u0627", text).replace("\u0649", "\u064a").replace("ё", "е")
+
+
+def words(text, folded=False):
+    """Уникальные слова текста в порядке появления (после fold)."""
+    return list(dict.fromkeys(w[:MAX_WORD] for w in _WORD.findall(text if folded else fold(text))))
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class StringTable(Sequence):
+    """Строки в одном utf-8 буфере: список без объекта str на элемент."""
+
+    def __init__(self, strings):
+        self._offsets = array("Q", [0])
+        data = bytearray()
+        for s in strings:
+            data += s.encode("utf-8")
+            self._offsets.append(len(data))
+        self._data = bytes(data)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+
+class Postings:
+    """
+    Словарь -> номера строк. Термы отсортированы (порядок utf-8 совпадает
+    с порядком str), posting-списки лежат подряд в одном массиве.
+    """
+
+    def __init__(self, mapping):
+        terms = sorted(mapping)
+        self.terms = StringTable(terms)
+        self.offsets = np.zeros(len(terms) + 1, np.int64)
+        np.cumsum([len(mapping[t]) for t in terms], out=self.offsets[1:])
+        self.rows = np.frombuffer(b"".join(mapping[t].tobytes() for t in terms), np.uint32)
+
+    def exact(self, term):
+        i = bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return self.rows[self.offsets[i]:self.offsets[i + 1]]
+        return self.rows[:0]
+
+    def prefix(self, term):
+        lo = bisect_left(self.terms, term)
+        hi = bisect_left(self.terms, term + chr(sys.maxunicode), lo)
+        return self.rows[self.offsets[lo]:self.offsets[hi]]
+
+
+class Segment:
+    """Неизменяемый индекс одного снапшота; строки — номера строк снапшота."""
+
+    def __init__(self, snap):
+        title_words = defaultdict(lambda: array("I"))
+        title_grams = defaultdict(lambda: array("I"))
+        description_words = defaultdict(lambda: array("I"))
+        titles = []
+        self.size = len(snap)
+        for row in range(self.size):
+            title = fold(snap.string("title", row) or "")
+            titles.append(title)
+            grams = set()
+            for word in words(title, folded=True):
+                title_words[word].append(row)
+                grams |= trigrams(word)
+            for gram in grams:
+                title_grams[gram].append(row)
+            description = (snap.string("description", row) or "")[:DESCRIPTION_CHARS]
+            for word in words(description):
+                description_words[word].append(row)
+        self.titles = StringTable(titles)
+        self.title_words = Postings(title_words)
+        self.title_grams = Postings(title_grams)
+        self.description_words = Postings(description_words)
+
+    def _substring(self, word, covered):
+        """Строки, где word — подстрока слова названия; covered — уже найденные, их не проверяем."""
+        grams = sorted(trigrams(word))
+        rows = self.title_grams.exact(grams[0])
+        for gram in grams[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, self.title_grams.exact(gram), assume_unique=True)
+        if len(grams) == 1:
+            return rows
+        # Триграммы могут встретиться в названии не подряд — проверяем подстроку
+        titles = self.titles
+        rows = rows[~covered[rows]]
+        return np.fromiter((r for r in rows.tolist() if word in titles[r]), np.uint32)
+
+    def match(self, word):
+        """Вес лучшего совпадения слова запроса по каждой строке сегмента (0 — нет)."""
+        best = np.zeros(self.size, np.float32)
+        title_prefix = self.title_words.rows[:0]
+        # По возрастанию веса: больший вес перезаписывает меньший
+        if len(word) >= MIN_PREFIX:
+            best[self.description_words.prefix(word)] = DESCRIPTION_PREFIX
+            title_prefix = self.title_words.prefix(word)
+        best[self.description_words.exact(word)] = DESCRIPTION_EXACT
+        if len(word) >= 3:
+            covered = np.zeros(self.size, bool)
+            covered[title_prefix] = True
+            best[self._substring(word, covered)] = TITLE_SUBSTRING
+        best[title_prefix] = TITLE_PREFIX
+        best[self.title_words.exact(word)] = TITLE_EXACT
+        return best
+
+    def search(self, query_words):
+        """Строки, где есть все слова запроса, и сумма весов."""
+        scores = np.zeros(self.size, np.float32)
+        found = np.ones(self.size, bool)
+        for word in query_words:
+            best = self.match(word)
+            found &= best > 0
+            if not found.any():
+                break
+            scores += best
+        rows = np.flatnonzero(found)
+        return rows, scores[rows]
+
+
+class SearchIndex:
+    """
+    Поиск по каналам ChannelIndex. Сегменты строятся при первом запросе
+    после смены таблицы индекса (или в refresh() заранее, см. serve.py).
+    """
+
+    def __init__(self, channel_index):
+        self.channel_index = channel_index
+        self._lock = threading.Lock()
+        # Снапшот -> сегмент; сегмент живёт, пока жив его снапшот
+        self._segments = weakref.WeakKeyDictionary()
+        # (таблица, [(сегмент, номер строки таблицы по строке снапшота или -1)])
+        self._state = (None, [])
+
+    def refresh(self):
+        table = self.channel_index.channels()
+        state = self._state
+        if state[0] is table:
+            return state
+        with self._lock:
+            if self._state[0] is table:
+                return self._state
+            parts = []
+            start = 0
+            for snap, rows in table.segments():
+                segment = self._segments.get(snap)
+                if segment is None:
+                    with SEGMENT_BUILD_SECONDS.time():
+                        segment = self._segments[snap] = Segment(snap)
+                # Строки снапшота, не попавшие в таблицу (дубликаты channel_id), — -1
+                table_rows = np.full(len(snap), -1, np.int64)
+                table_rows[rows] = np.arange(start, start + len(rows))
+                start += len(rows)
+                parts.append((segment, table_rows))
+            self._state = (table, parts)
+            return self._state
+
+    def search(self, query, offset=0, limit=20):
+        """
+        (число найденных каналов, ChannelRecord страницы). Канал должен содержать
+        все слова запроса; порядок — по релевантности, затем по подписчикам.
+        """
+        query_words = words(query)[:MAX_QUERY_WORDS]
+        table, parts = self.refresh()
+        if not query_words:
+            return 0, iter(())
+        found_rows, found_scores = [], []
+        for segment, table_rows in parts:
+            rows, scores = segment.search(query_words)
+            rows = table_rows[rows]
+            keep = rows >= 0
+            found_rows.append(rows[keep])
+            found_scores.append(scores[keep])
+        if not found_rows:
+            return 0, iter(())
+        rows = np.concatenate(found_rows)
+        scores = np.concatenate(found_scores)
+        # Вес (шаг 0.5) и подписчики в одном ключе; при равенстве — порядок строк таблицы
+        keys = (scores.astype(np.float64) * 2 ** 32
+                + np.minimum(table.column("subscribers")[rows], 2 ** 31 - 1))
+        total = len(rows)
+        # Полная сортировка не нужна: только ключи не ниже k-го по величине
+        k = offset + limit
+        if k < total:
+            selected = keys >= np.partition(keys, total - k)[total - k]
+            rows, keys = rows[selected], keys[selected]
+        ranked = rows[np.lexsort((rows, -keys))]
+        return total, table.records(ranked[offset:offset + limit])
@@ -0,0 +1,78 @@
+"""
+Продакшн-запуск server.py под gunicorn:
+
+    python serve.py                      # воркеров = число ядер
+    WEB_WORKERS=4 WEB_THREADS=8 python serve.py
+
+Индекс каналов (с индексами фильтров /channels), поисковый индекс и рейтинг
+роста загружаются в мастере до fork, поэтому воркеры разделяют их страницы
+памяти (copy-on-write), а не держат по копии на процесс.
+
+/metrics под gunicorn отдаёт сумму по всем воркерам: воркеры сбрасывают
+метрики в WEB_METRICS_DIR (по умолчанию — новый временный каталог на запуск).
+"""
+import gc
+import multiprocessing
+import os
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+import metrics
+import server
+
+WEB_BIND = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", str(multiprocessing.cpu_count())))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "4"))
+WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", "60"))
+WEB_METRICS_DIR = os.environ.get("WEB_METRICS_DIR")
+
+
+class ServerApplication(BaseApplication):
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def preload():
+    """Загружает данные в мастере и замораживает их для сборщика мусора."""
+    server.channel_index.refresh(force=True)
+    server.channel_index.channels().query()
+    server.search_index.refresh()
+    server.growth_index.refresh()
+    # Без freeze сборщик мусора в воркерах трогает заголовки объектов
+    # и постепенно копирует все разделяемые страницы
+    gc.freeze()
+
+
+def post_fork(arbiter, worker):
+    # Поток сброса метрик не переживает fork — запускается в каждом воркере
+    metrics.start_worker()
+
+
+def main():
+    preload()
+    metrics.enable_multiprocess(WEB_METRICS_DIR or tempfile.mkdtemp(prefix="web_metrics_"))
+    options = {
+        "bind": WEB_BIND,
+        "workers": WEB_WORKERS,
+        "threads": WEB_THREADS,
+        "worker_class": "gthread",
+        "timeout": WEB_TIMEOUT,
+        "preload_app": True,
+        "post_fork": post_fork,
+    }
+    print(f"Serving on {WEB_BIND}: {WEB_WORKERS} workers x {WEB_THREADS} threads")
+    ServerApplication(server.app, options).run()
+
+
+if __name__ == "__main__":
+    main()
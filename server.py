@@ -1,55 +1,149 @@
-from flask import Flask, jsonify, request
-import json
+from flask import Flask, Response, g, jsonify, request
+from flask.json.provider import JSONProvider
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta, timezone
+from channel_index import ChannelIndex
+from growth_index import METRICS, RANKINGS, WINDOWS as GROWTH_WINDOWS, GrowthIndex
+from hashtag_store import HASHTAG_DB, WINDOWS, HashtagStore
+from history_store import HISTORY_DB, HistoryStore
+from http_cache import ResponseCache
+import json_codec
+import metrics
+import profiling
+from search_index import SearchIndex
+from storage import read_json
+
+class CodecJSONProvider(JSONProvider):
+    """jsonify через json_codec (orjson/msgspec, если установлены); ключи сортируются, как у Flask."""
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj, sort_keys=True).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_codec.dumps(obj, sort_keys=True) + b"\n",
+                                        mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 # Абсолютный путь к папке channels_history
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 HISTORY_DIR = os.path.join(BASE_DIR, "channels_history")
+channel_index = ChannelIndex()
+search_index = SearchIndex(channel_index)
+history_store = HistoryStore(HISTORY_DB)
+hashtag_store = HashtagStore(HASHTAG_DB)
+growth_index = GrowthIndex(history_store, channel_index)
+# Данные меняются только после цикла сбора (SCHEDULE_HOURS) — ответы кешируются по версии
+response_cache = ResponseCache()
+# Профилирование запросов по X-Profile — только при WEB_PROFILE=1
+profiling.init_app(app)
+
+REQUEST_SECONDS = metrics.histogram("http_request_seconds", "Время обработки запроса до последнего байта",
+                                    ("route", "method", "status"))
+RESPONSE_BYTES = metrics.histogram("http_response_bytes", "Размер тела ответа", ("route",),
+                                   buckets=metrics.SIZE_BUCKETS)
+CHANNELS_LOADED = metrics.gauge("channel_index_channels", "Каналов в индексе")
+HISTORY_FILE_READS = metrics.counter("history_json_fallback_total",
+                                     "Ответы из channels_history/*.json (история не перенесена в SQLite)",
+                                     ("route",))
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response):
+    started = g.pop("started", None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = {"route": route, "method": request.method, "status": response.status_code}
+
+    if not response.is_streamed:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+        RESPONSE_BYTES.observe(response.calculate_content_length() or 0, route=route)
+        return response
+
+    # Потоковый ответ: время и размер известны, только когда отдан последний кусок
+    body = response.response
+
+    def counted():
+        size = 0
+        try:
+            for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+            RESPONSE_BYTES.observe(size, route=route)
+    response.response = counted()
+    return response
+
+
 def load_all_channels():
-    """Загружает все *_filtered.json и убирает дубликаты по channel_id."""
-    all_channels = []
-    seen_ids = set()
-
-    for filename in os.listdir():
-        if filename.endswith("_filtered.json"):
-            with open(filename, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    for c in data:
-                        cid = c.get("channel_id")
-                        if cid and cid not in seen_ids:
-                            seen_ids.add(cid)
-                            all_channels.append(c)
-                except Exception as e:
-                    print(f"Ошибка чтения {filename}: {e}")
-    return all_channels
+    """Каналы из всех *_filtered.json без дубликатов по channel_id (из общего индекса)."""
+    return list(channel_index.channels())
+
+
+def read_history_file(channel_id):
+    """История из channels_history/<id>.json для каналов, ещё не перенесённых в SQLite; иначе None."""
+    file_path = os.path.join(HISTORY_DIR, f"{channel_id}.json")
+    if not os.path.exists(file_path):
+        return None
+    route = request.url_rule.rule if request.url_rule else request.path
+    HISTORY_FILE_READS.inc(route=route)
+    return read_json(file_path)
+
+
+def daily_from_file(data, since=None, until=None):
+    """(channel_title, дневные точки за [since, until]) из истории формата channels_history/*.json."""
+    points = sorted(
+        ({"date": d["date"], "subscribers": d["subscribers"],
+          "views_total": d["views_total"], "videos_total": d["videos_total"]}
+         for d in data.get("history", {}).get("daily", [])
+         if (since or "") <= d["date"] <= (until or "9999-12-31")),
+        key=lambda d: d["date"])
+    return data.get("channel_title"), points
+
+
 @app.route("/channel_growth/<channel_id>", methods=["GET"])
+@response_cache.cached(lambda: history_store.version())
 def get_channel_growth(channel_id):
     """
     Анализирует рост канала по подписчикам, просмотрам и видео.
-    Ищет данные в файлах trending_channels_*.json
+    Берёт дневную историю канала из history_store по channel_id
+    (или из channels_history/<id>.json, как /channel_analytics):
+    /channel_growth/<id>?from=2025-11-01&to=2025-11-30
+    Без from/to сравниваются две последние точки.
     """
-    channel_history = []
-
-    # Собираем все файлы с трендами
-    for filename in os.listdir():
-        if filename.startswith("trending_channels_") and filename.endswith(".json"):
-            try:
-                with open(filename, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for ch in data:
-                        if ch.get("channel_id") == channel_id:
-                            channel_history.append(ch)
-            except Exception as e:
-                print(f"Ошибка чтения {filename}: {e}")
+    since = request.args.get("from")
+    until = request.args.get("to")
+    try:
+        for value in (since, until):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        return jsonify({"error": "from/to должны быть датами в формате YYYY-MM-DD"}), 400
+
+    found = history_store.get_daily(channel_id, since, until)
+    if found is None:
+        # Каналы, ещё не перенесённые из channels_history/*.json (python history_store.py)
+        data = read_history_file(channel_id)
+        if data is None:
+            return jsonify({"error": "Канал не найден"}), 404
+        found = daily_from_file(data, since, until)
+    channel_title, channel_history = found
 
     if not channel_history:
-        return jsonify({"error": "Канал не найден"}), 404
-
-    # Сортируем по дате
-    channel_history.sort(key=lambda x: x.get("last_seen", ""), reverse=False)
+        return jsonify({"error": "Нет данных за выбранный период"}), 404
 
     if len(channel_history) < 2:
         return jsonify({
@@ -57,8 +151,8 @@ def get_channel_growth(channel_id):
             "current": channel_history[-1]
         })
 
-    # Берём последнюю и предыдущую запись
-    prev = channel_history[-2]
+    # За период — первая и последняя точка, иначе последняя и предыдущая
+    prev = channel_history[0] if (since or until) else channel_history[-2]
     curr = channel_history[-1]
 
     def growth(old, new):
@@ -68,236 +162,290 @@ def get_channel_growth(channel_id):
 
     result = {
         "channel_id": channel_id,
-        "channel_title": curr.get("channel_title"),
-        "date_prev": prev.get("last_seen"),
-        "date_curr": curr.get("last_seen"),
-        "subscribers": {
-            "previous": prev.get("subscribers", 0),
-            "current": curr.get("subscribers", 0),
-            "growth_percent": growth(prev.get("subscribers", 0), curr.get("subscribers", 0))
-        },
-        "views_total": {
-            "previous": prev.get("views_total", 0),
-            "current": curr.get("views_total", 0),
-            "growth_percent": growth(prev.get("views_total", 0), curr.get("views_total", 0))
-        },
-        "videos_total": {
-            "previous": prev.get("videos_total", 0),
-            "current": curr.get("videos_total", 0),
-            "growth_percent": growth(prev.get("videos_total", 0), curr.get("videos_total", 0))
-        }
+        "channel_title": channel_title,
+        "date_prev": prev["date"],
+        "date_curr": curr["date"],
     }
-
-    # Опционально — сохраняем статистику роста
-    with open("channel_growth.json", "a", encoding="utf-8") as f:
-        f.write(json.dumps(result, ensure_ascii=False) + "\n")
-
+    for field in ("subscribers", "views_total", "videos_total"):
+        result[field] = {
+            "previous": prev[field],
+            "current": curr[field],
+            "change": curr[field] - prev[field],
+            "growth_percent": growth(prev[field], curr[field])
+        }
     return jsonify(result)
 
+
 @app.route("/hashtags", methods=["GET"])
+@response_cache.cached(lambda: hashtag_store.version())
 def get_hashtags():
     """
-    Возвращает список хэштегов из файла trend_hashtags.txt,
-    отсортированных по популярности (от большего к меньшему).
+    Топ хэштегов по доле трендовых видео, отсортированных по популярности:
+    /hashtags?region=US&window=24h|7d|30d&limit=100&format=json|ndjson
     """
-    hashtag_file = "trend_hashtags.txt"
-    if not os.path.exists(hashtag_file):
-        return jsonify({"error": "Файл trend_hashtags.txt не найден"}), 404
-
-    hashtags = []
-    with open(hashtag_file, "r", encoding="utf-8") as f:
-        for line in f:
-            if "|" in line:
-                try:
-                    tag, pct = line.strip().split("|", 1)
-                    pct_value = float(pct.strip().replace("%", ""))
-                    hashtags.append({"tag": tag.strip(), "popularity": pct_value})
-                except ValueError:
-                    continue
-
-    hashtags.sort(key=lambda x: x["popularity"], reverse=True)
-    return jsonify(hashtags)
-HISTORY_DIR = "channels_history"
-def filter_by_date(channels, period):
-    """Фильтрация по дате создания канала."""
-    now = datetime.utcnow()
-    if period == "week":
-        cutoff = now - timedelta(days=7)
-    elif period == "month":
-        cutoff = now - timedelta(days=30)
-    elif period == "90days":
-        cutoff = now - timedelta(days=90)
-    else:
-        return channels
-
-    filtered = []
-    for c in channels:
-        try:
-            created = datetime.fromisoformat(c["published_at"].replace("Z", "+00:00"))
-            if created >= cutoff:
-                filtered.append(c)
-        except Exception:
-            continue
-    return filtered
-
-
-@app.route("/channels", methods=["GET"])
-def get_channels():
+    region = request.args.get("region", "").strip().upper() or None
+    window = request.args.get("window", "24h")
+    fmt = request.args.get("format", "json")
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": "format должен быть json или ndjson"}), 400
+    if window not in WINDOWS:
+        return jsonify({"error": f"window должен быть одним из: {', '.join(WINDOWS)}"}), 400
+    try:
+        limit = int_arg("limit", default=100, minimum=1)
+    except ValueError:
+        return jsonify({"error": "Некорректный параметр limit"}), 400
+
+    hashtags = hashtag_store.top(region=region, window=window, limit=limit)
+    if not hashtags:
+        return jsonify({"error": "Нет данных по хэштегам"}), 404
+    return stream_json(hashtags, fmt)
+
+
+def growth_version():
+    """Рейтинг роста зависит от истории и (для region) от состава файлов регионов."""
+    generation, updated_at = history_store.version()
+    fingerprint, last_modified = channel_index.version()
+    return f"{generation}:{fingerprint}", max(updated_at, last_modified)
+
+
+@app.route("/top_growers", methods=["GET"])
+@response_cache.cached(growth_version)
+def get_top_growers():
     """
-    Основной роут:
-    /channels?sort=subscribers|views&date=week|month|90days
+    Каналы с наибольшим ростом за окно по дневной истории всех каналов:
+    /top_growers?metric=subscribers|views|videos&window=7d|30d|quarter&region=US
+                &limit=100&by=absolute|percent&format=json|ndjson
     """
-    sort_by = request.args.get("sort", "subscribers")
-    date_filter = request.args.get("date")
-
-    channels = load_all_channels()
-    if not channels:
-        return jsonify({"error": "Нет данных"}), 404
-
-    if date_filter:
-        channels = filter_by_date(channels, date_filter)
+    metric = request.args.get("metric", "subscribers")
+    window = request.args.get("window", "7d")
+    region = request.args.get("region", "").strip().upper() or None
+    by = request.args.get("by", "absolute")
+    fmt = request.args.get("format", "json")
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": "format должен быть json или ndjson"}), 400
+    if metric not in METRICS:
+        return jsonify({"error": f"metric должен быть одним из: {', '.join(METRICS)}"}), 400
+    if window not in GROWTH_WINDOWS:
+        return jsonify({"error": f"window должен быть одним из: {', '.join(GROWTH_WINDOWS)}"}), 400
+    if by not in RANKINGS:
+        return jsonify({"error": f"by должен быть одним из: {', '.join(RANKINGS)}"}), 400
+    try:
+        limit = int_arg("limit", default=100, minimum=1)
+    except ValueError:
+        return jsonify({"error": "Некорректный параметр limit"}), 400
+
+    growers = growth_index.top(metric=metric, window=window, region=region, limit=limit, by=by)
+    if not growers:
+        return jsonify({"error": "Нет данных о росте каналов"}), 404
+    return stream_json(growers, fmt)
 
-    # Сортировка по популярности
-    reverse = True
-    if sort_by == "views":
-        channels.sort(key=lambda x: x.get("views", 0), reverse=reverse)
-    else:
-        channels.sort(key=lambda x: x.get("subscribers", 0), reverse=reverse)
 
-    return jsonify(channels)
-
-
-@app.route("/channel_analytics/<channel_id>", methods=["GET"])
-def channel_analytics(channel_id):
-    import urllib.parse
-    channel_id = urllib.parse.unquote(channel_id)  # декодируем URL
-    file_path = os.path.join(HISTORY_DIR, f"{channel_id}.json")
-    print("Looking for file:", file_path)
-    print("Exists:", os.path.exists(file_path))
-    
-    if not os.path.exists(file_path):
-        return jsonify({"error": f"Канал {channel_id} не найден"}), 404
+HISTORY_DIR = "channels_history"
+DATE_PERIODS = {"week": 7, "month": 30, "90days": 90}
+# Метрики с фильтрами min_<метрика>/max_<метрика> в /channels
+CHANNEL_METRICS = ("subscribers", "views", "videos")
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        history = json.load(f)
-    return jsonify(history)
 
+def date_cutoff(period):
+    """Нижняя граница даты создания канала (unix-время) для week|month|90days, иначе None."""
+    if period not in DATE_PERIODS:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=DATE_PERIODS[period])).timestamp()
 
 
-@app.route("/")
-def index():
-    return jsonify({
-        "routes": {
-            "/channels": "Получить все каналы (параметры: sort=subscribers|views, date=week|month|90days)",
-            "/channel/<id>": "Получить данные конкретного канала"
-        }
-    })
-
+# Сколько записей сериализуется за один кусок потокового ответа
+STREAM_CHUNK = 500
+STREAM_FORMATS = ("json", "ndjson")
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
-from flask import Flask, jsonify, request
-import json
-import os
-from datetime import datetime, timedelta
-
-app = Flask(__name__)
 
-def load_all_channels():
-    """Загружает все *_filtered.json и убирает дубликаты по channel_id."""
-    all_channels = []
-    seen_ids = set()
-
-    for filename in os.listdir():
-        if filename.endswith("_filtered.json"):
-            with open(filename, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    for c in data:
-                        cid = c.get("channel_id")
-                        if cid and cid not in seen_ids:
-                            seen_ids.add(cid)
-                            all_channels.append(c)
-                except Exception as e:
-                    print(f"Ошибка чтения {filename}: {e}")
-    return all_channels
-
-
-def filter_by_date(channels, period):
-    """Фильтрация по дате создания канала."""
-    now = datetime.utcnow()
-    if period == "week":
-        cutoff = now - timedelta(days=7)
-    elif period == "month":
-        cutoff = now - timedelta(days=30)
-    elif period == "90days":
-        cutoff = now - timedelta(days=90)
-    else:
-        return channels
-
-    filtered = []
-    for c in channels:
-        try:
-            created = datetime.fromisoformat(c["published_at"].replace("Z", "+00:00"))
-            if created >= cutoff:
-                filtered.append(c)
-        except Exception:
-            continue
-    return filtered
+def stream_json(rows, fmt="json"):
+    """
+    Потоковый ответ (chunked): JSON-массив или NDJSON при format=ndjson.
+    В памяти одновременно только STREAM_CHUNK сериализованных записей.
+    """
+    def dumps(row):
+        return json_codec.dumps(row, sort_keys=True)
+
+    def chunks():
+        buf = []
+        for row in rows:
+            buf.append(dumps(row))
+            if len(buf) >= STREAM_CHUNK:
+                yield buf
+                buf = []
+        if buf:
+            yield buf
+
+    if fmt == "ndjson":
+        def generate():
+            for buf in chunks():
+                yield b"\n".join(buf) + b"\n"
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    def generate():
+        yield b"["
+        sep = b""
+        for buf in chunks():
+            yield sep + b",".join(buf)
+            sep = b","
+        yield b"]\n"
+    return Response(generate(), mimetype="application/json")
+
+
+def date_arg(name, end=False):
+    """
+    Граница даты создания канала (unix-время) из query-параметра: YYYY-MM-DD
+    (end=True — конец этого дня) или дата-время ISO 8601; ValueError, если некорректна,
+    OverflowError — за пределами datetime (9999-12-31 с end=True).
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    if len(value) == 10:
+        day = datetime.combine(date.fromisoformat(value), datetime.min.time(), timezone.utc)
+        return (day + timedelta(days=1)).timestamp() - 1 if end else day.timestamp()
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def int_arg(name, default=None, minimum=0):
+    """Целочисленный query-параметр; ValueError, если он некорректный."""
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    value = int(value)
+    if value < minimum:
+        raise ValueError(name)
+    return value
 
 
 @app.route("/channels", methods=["GET"])
+@response_cache.cached(lambda: channel_index.version())
 def get_channels():
     """
     Основной роут:
     /channels?sort=subscribers|views&date=week|month|90days
+             &region=US,DE&published_from=2024-01-01&published_to=2024-12-31
+             &min_subscribers=&max_subscribers=&min_views=&max_views=&min_videos=&max_videos=
+             &limit=50&offset=0&format=json|ndjson
+    Фильтры сочетаются через И, несколько регионов — через ИЛИ.
+    Число каналов под фильтрами — в заголовке X-Total-Count.
     """
     sort_by = request.args.get("sort", "subscribers")
     date_filter = request.args.get("date")
-
-    channels = load_all_channels()
-    if not channels:
+    fmt = request.args.get("format", "json")
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": "format должен быть json или ndjson"}), 400
+    try:
+        limit = int_arg("limit", minimum=1)
+        offset = int_arg("offset", default=0)
+        ranges = {col: (int_arg(f"min_{col}"), int_arg(f"max_{col}")) for col in CHANNEL_METRICS}
+    except ValueError:
+        return jsonify({"error": "Некорректные параметры limit/offset/min_*/max_*"}), 400
+    try:
+        published_after = date_arg("published_from")
+        published_before = date_arg("published_to", end=True)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "published_from/published_to должны быть датами в формате YYYY-MM-DD или ISO 8601"}), 400
+    cutoff = date_cutoff(date_filter)
+    if cutoff is not None:
+        published_after = cutoff if published_after is None else max(published_after, cutoff)
+    regions = [code.strip().upper() for code in request.args.get("region", "").split(",") if code.strip()]
+
+    if not channel_index.channels():
         return jsonify({"error": "Нет данных"}), 404
 
-    if date_filter:
-        channels = filter_by_date(channels, date_filter)
-
-    # Сортировка по популярности
-    reverse = True
-    if sort_by == "views":
-        channels.sort(key=lambda x: x.get("views", 0), reverse=reverse)
-    else:
-        channels.sort(key=lambda x: x.get("subscribers", 0), reverse=reverse)
-
-    return jsonify(channels)
+    # Фильтры — пересечение битмапов индекса, страница берётся из заранее
+    # отсортированного представления и сериализуется потоком
+    total, channels = channel_index.query(
+        sort_by=sort_by,
+        offset=offset,
+        limit=limit,
+        regions=regions,
+        published_after=published_after,
+        published_before=published_before,
+        ranges=ranges,
+    )
+    response = stream_json(channels, fmt)
+    response.headers["X-Total-Count"] = str(total)
+    if limit is not None and offset + limit < total:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return response
+
+
+@app.route("/search", methods=["GET"])
+@response_cache.cached(lambda: channel_index.version())
+def search_channels():
+    """
+    Поиск каналов по названию и описанию:
+    /search?q=новости спорт&limit=20&offset=0&format=json|ndjson
+    Канал должен содержать все слова запроса (по префиксу, в названии — и как
+    подстроку); выше — совпадения в названии, затем каналы с большим числом
+    подписчиков. Всего найдено — в X-Total-Count.
+    """
+    query = request.args.get("q", "")
+    fmt = request.args.get("format", "json")
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": "format должен быть json или ndjson"}), 400
+    try:
+        limit = int_arg("limit", default=20, minimum=1)
+        offset = int_arg("offset", default=0)
+    except ValueError:
+        return jsonify({"error": "Некорректные параметры limit/offset"}), 400
+    if not query.strip():
+        return jsonify({"error": "Параметр q обязателен"}), 400
+
+    total, channels = search_index.search(query, offset=offset, limit=limit)
+    response = stream_json(list(channels), fmt)
+    response.headers["X-Total-Count"] = str(total)
+    if offset + limit < total:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return response
 
 
 @app.route("/channel_analytics/<channel_id>", methods=["GET"])
+@response_cache.cached(lambda: history_store.version())
 def channel_analytics(channel_id):
-    file_path = os.path.join(HISTORY_DIR, f"{channel_id}.json")
-    
-    # Логирование для отладки
-    print("Looking for file:", file_path)
-    print("Exists:", os.path.exists(file_path))
-    
-    if not os.path.exists(file_path):
+    import urllib.parse
+    channel_id = urllib.parse.unquote(channel_id)  # декодируем URL
+    history = history_store.get_history(channel_id)
+    if history is not None:
+        return jsonify(history)
+
+    # Каналы, ещё не перенесённые из channels_history/*.json (python history_store.py)
+    data = read_history_file(channel_id)
+    if data is None:
         return jsonify({"error": f"Канал {channel_id} не найден"}), 404
+    return jsonify(data)
+
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        history = json.load(f)
 
-    return jsonify(history)
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    CHANNELS_LOADED.set(len(channel_index.channels()))
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route("/")
 def index():
     return jsonify({
         "routes": {
-            "/channels": "Получить все каналы (параметры: sort=subscribers|views, date=week|month|90days)",
-            "/channel/<id>": "Получить данные конкретного канала"
+            "/channels": "Получить все каналы (параметры: sort=subscribers|views, date=week|month|90days, region=US,DE, published_from, published_to, min_/max_subscribers, min_/max_views, min_/max_videos, limit, offset, format=json|ndjson)",
+            "/channel_growth/<id>": "Рост канала (параметры: from, to — даты YYYY-MM-DD)",
+            "/search": "Поиск каналов по названию и описанию (параметры: q, limit, offset, format=json|ndjson)",
+            "/top_growers": "Каналы с наибольшим ростом (параметры: metric=subscribers|views|videos, window=7d|30d|quarter, region, limit, by=absolute|percent, format=json|ndjson)",
+            "/hashtags": "Топ хэштегов (параметры: region, window=24h|7d|30d, limit, format=json|ndjson)",
+            "/channel/<id>": "Получить данные конкретного канала",
+            "/metrics": "Метрики в формате Prometheus"
         }
     })
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Отладчик Werkzeug выполняет код из браузера — с WEB_DEBUG=1 слушаем только localhost.
+    # Продакшн-запуск — serve.py (gunicorn)
+    debug = os.environ.get("WEB_DEBUG") == "1"
+    app.run(host="127.0.0.1" if debug else "0.0.0.0", port=5000, debug=debug)
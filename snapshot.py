@@ -0,0 +1,254 @@
+from array import array
+from datetime import datetime
+import json
+import mmap
+import os
+import sys
+import time
+from json_codec import ChannelRecord
+from storage import atomic_write_bytes
+
+SNAPSHOT_FILE = "channels_snapshot.bin"
+MAGIC = b"YTCHSNP1"
+FORMAT_VERSION = 2
+
+NUMERIC_COLUMNS = ("subscribers", "views", "videos")
+STRING_COLUMNS = ("channel_id", "title", "description", "published_at", "channel_url", "thumbnail")
+SORT_FIELDS = ("subscribers", "views")
+# published_ts для каналов без корректной даты создания
+NO_DATE = -(2 ** 63)
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+_MASK64 = 0xffffffffffffffff
+
+
+def fnv1a(data):
+    """Детерминированный хеш channel_id (hash() в Python меняется между процессами)."""
+    h = _FNV_OFFSET
+    for b in data:
+        h = ((h ^ b) * _FNV_PRIME) & _MASK64
+    return h
+
+
+def parse_published(value):
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except Exception:
+        return NO_DATE
+
+
+def _pad(length):
+    return (-length) % 8
+
+
+def build_snapshot(channels, source_version="", regions=None):
+    """
+    Собирает снапшот из списка каналов (формат *_filtered.json, без дубликатов).
+    regions — {код региона: номера строк каналов из его файла}.
+    Возвращает список кусков байтов файла.
+
+    Формат: MAGIC, uint32 длина заголовка, JSON-заголовок с секциями
+    {имя: [offset, length, typecode]}, затем секции, выровненные по 8 байт:
+    числовые колонки, строковые таблицы (offsets + utf-8 + маска None),
+    готовые сортировки по убыванию, хеш-индекс channel_id (открытая адресация)
+    и отсортированные строки каналов каждого региона.
+    """
+    n = len(channels)
+    sections = []
+
+    for col in NUMERIC_COLUMNS:
+        sections.append((col, array("q", (int(c.get(col) or 0) for c in channels))))
+    sections.append(("published_ts", array("q", (parse_published(c.get("published_at") or "")
+                                                 for c in channels))))
+
+    encoded_ids = None
+    for col in STRING_COLUMNS:
+        offsets = array("Q", [0])
+        nulls = array("B")
+        blob = bytearray()
+        encoded = []
+        for c in channels:
+            value = c.get(col)
+            nulls.append(1 if value is None else 0)
+            raw = b"" if value is None else str(value).encode("utf-8")
+            encoded.append(raw)
+            blob += raw
+            offsets.append(len(blob))
+        if col == "channel_id":
+            encoded_ids = encoded
+        sections.append((f"{col}.offsets", offsets))
+        sections.append((f"{col}.data", array("B", bytes(blob))))
+        sections.append((f"{col}.nulls", nulls))
+
+    # Порядок как у сортировки в ChannelIndex: по убыванию, при равенстве — исходный
+    for field in SORT_FIELDS:
+        order = sorted(range(n), key=lambda i: channels[i].get(field, 0), reverse=True)
+        sections.append((f"order.{field}", array("I", order)))
+
+    size = 1
+    while size < 2 * n:
+        size *= 2
+    table = array("I", bytes(4 * size))
+    for row, raw in enumerate(encoded_ids):
+        slot = fnv1a(raw) & (size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = row + 1
+    sections.append(("hash", table))
+
+    for region, rows in sorted((regions or {}).items()):
+        sections.append((f"region.{region}", array("I", sorted(rows))))
+
+    layout = {}
+    offset = 0
+    for name, arr in sections:
+        length = len(arr) * arr.itemsize
+        layout[name] = [offset, length, arr.typecode]
+        offset += length + _pad(length)
+
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "count": n,
+        "source_version": source_version,
+        "created_at": int(time.time()),
+        "sections": layout,
+    }).encode("utf-8")
+    prefix = MAGIC + len(header).to_bytes(4, "little") + header
+    chunks = [prefix, bytes(_pad(len(prefix)))]
+    for _, arr in sections:
+        data = arr.tobytes()
+        chunks.append(data)
+        chunks.append(bytes(_pad(len(data))))
+    return chunks
+
+
+def write_snapshot(channels, path=SNAPSHOT_FILE, source_version="", regions=None):
+    atomic_write_bytes(path, build_snapshot(channels, source_version, regions))
+
+
+class Snapshot:
+    """
+    Снапшот каналов, открытый через mmap: колонки читаются без разбора JSON,
+    страницы файла общие для всех процессов, которые его открыли.
+    С data= снапшот читается из байтов в памяти (см. from_channels).
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE, data=None):
+        self.path = path
+        if data is None:
+            with open(path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            buf = memoryview(self._mm)
+        else:
+            self._mm = None
+            buf = memoryview(data)
+        if bytes(buf[:8]) != MAGIC:
+            raise ValueError(f"{path}: не снапшот каналов")
+        header_len = int.from_bytes(buf[8:12], "little")
+        header = json.loads(bytes(buf[12:12 + header_len]))
+        if header["format"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: неподдерживаемый формат снапшота")
+        base = 12 + header_len
+        base += _pad(base)
+        self._buf = buf
+
+        self.count = header["count"]
+        self.source_version = header["source_version"]
+        self.created_at = header["created_at"]
+        self._sections = {
+            name: buf[base + off:base + off + length].cast(typecode)
+            for name, (off, length, typecode) in header["sections"].items()
+        }
+        # Колонки для row(): без поиска секций по имени на каждую строку
+        self._strings = [(col, self._sections[f"{col}.nulls"], self._sections[f"{col}.offsets"],
+                          self._sections[f"{col}.data"]) for col in STRING_COLUMNS]
+        self._numbers = [(col, self._sections[col]) for col in NUMERIC_COLUMNS]
+
+    @classmethod
+    def from_channels(cls, channels):
+        """Снапшот списка каналов в памяти — компактное хранение без dict и str на запись."""
+        return cls("<memory>", data=b"".join(build_snapshot(channels)))
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        """Числовая колонка (subscribers, views, videos, published_ts) как memoryview."""
+        return self._sections[name]
+
+    def order(self, field):
+        """Номера строк по убыванию field."""
+        return self._sections[f"order.{field}"]
+
+    def regions(self):
+        """{код региона: отсортированные номера строк его каналов}."""
+        return {name[len("region."):]: view for name, view in self._sections.items()
+                if name.startswith("region.")}
+
+    def string(self, col, row):
+        if self._sections[f"{col}.nulls"][row]:
+            return None
+        offsets = self._sections[f"{col}.offsets"]
+        return self._sections[f"{col}.data"][offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def row(self, row):
+        """Канал как ChannelRecord (запись *_filtered.json)."""
+        record = {col: None if nulls[row] else str(data[offsets[row]:offsets[row + 1]], "utf-8")
+                  for col, nulls, offsets, data in self._strings}
+        for col, values in self._numbers:
+            record[col] = values[row]
+        return ChannelRecord(**record)
+
+    def find(self, channel_id):
+        """Номер строки по channel_id через хеш-индекс или None."""
+        table = self._sections["hash"]
+        mask = len(table) - 1
+        raw = channel_id.encode("utf-8")
+        slot = fnv1a(raw) & mask
+        offsets = self._sections["channel_id.offsets"]
+        data = self._sections["channel_id.data"]
+        while table[slot]:
+            row = table[slot] - 1
+            if data[offsets[row]:offsets[row + 1]] == raw:
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def close(self):
+        for view in self._sections.values():
+            view.release()
+        self._sections = {}
+        self._strings = self._numbers = []
+        self._buf.release()
+        if self._mm is not None:
+            self._mm.close()
+
+
+def publish_snapshot(data_dir=".", path=None):
+    """Собирает снапшот из текущих *_filtered.json (конец цикла сбора)."""
+    from channel_index import ChannelIndex
+
+    path = path or os.path.join(data_dir, SNAPSHOT_FILE)
+    index = ChannelIndex(data_dir, use_snapshot=False)
+    table = index.channels()
+    channels = list(table)
+    regions = {region: table.region_rows(region).tolist() for region in table.regions()}
+    version, _ = index.version()
+    try:
+        snap = Snapshot(path)
+        current = snap.source_version
+        snap.close()
+    except (OSError, ValueError):
+        current = None
+    if current == version:
+        print(f"Snapshot {path} is up to date")
+        return len(channels)
+    write_snapshot(channels, path, source_version=version, regions=regions)
+    print(f"Snapshot {path}: {len(channels)} channels")
+    return len(channels)
+
+
+if __name__ == "__main__":
+    publish_snapshot()
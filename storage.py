@@ -0,0 +1,114 @@
+import os
+import tempfile
+import threading
+import time
+import json_codec
+from metrics import FILE_IO_BYTES, FILE_IO_SECONDS, STORE_ROWS
+
+
+def atomic_write_bytes(path, data):
+    """
+    Пишет файл целиком через временный файл и os.replace — читатели не видят половину.
+    Возвращает число записанных байт.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.basename(path), dir=directory)
+    try:
+        # mkstemp создаёт файл с правами 0600 — сохраняем права заменяемого файла
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp, mode)
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                written = f.write(data)
+            else:
+                # Итерируемое кусков — большие файлы не склеиваются в памяти
+                written = sum(f.write(chunk) for chunk in data)
+        os.replace(tmp, path)
+        return written
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def atomic_write_text(path, text):
+    return atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_json(path, data, pretty=False):
+    return atomic_write_bytes(path, json_codec.dumps(data, pretty=pretty))
+
+
+def read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        return json_codec.loads(f.read())
+
+
+class CycleWriter:
+    """
+    Копит обновления файлов регионов, хэштегов и истории каналов за цикл сбора
+    и записывает каждый файл (и каждое хранилище) один раз в flush().
+    """
+
+    def __init__(self, history_store=None, hashtag_store=None):
+        self.history_store = history_store
+        self.hashtag_store = hashtag_store
+        self._lock = threading.Lock()
+        self._regions = {}
+        self._hashtags = []
+        self._history = []
+
+    def update_region(self, filename, channels):
+        with self._lock:
+            pending = self._regions.setdefault(filename, {})
+            for ch in channels:
+                pending[ch["channel_id"]] = ch
+
+    def update_history(self, channels):
+        with self._lock:
+            self._history.extend(channels)
+
+    def update_hashtags(self, day, region, videos, counter):
+        """counter: {тег: число видео региона с этим тегом}, videos — всего видео региона"""
+        with self._lock:
+            self._hashtags.append((day, region, videos, counter))
+
+    def flush(self):
+        """Сливает накопленное с файлами на диске. Возвращает {filename: число каналов}."""
+        with self._lock:
+            regions, self._regions = self._regions, {}
+            hashtags, self._hashtags = self._hashtags, []
+            history, self._history = self._history, []
+
+        # SQLite пишет страницами в WAL — для хранилищ считаем время и строки, а не байты
+        if history and self.history_store is not None:
+            with FILE_IO_SECONDS.time(target="history", op="write"):
+                STORE_ROWS.inc(self.history_store.append_many(history), target="history")
+        if hashtags and self.hashtag_store is not None:
+            with FILE_IO_SECONDS.time(target="hashtags", op="write"):
+                self.hashtag_store.add_counts(hashtags)
+            STORE_ROWS.inc(sum(len(counter) for _, _, _, counter in hashtags), target="hashtags")
+
+        counts = {}
+        for filename, pending in regions.items():
+            # Обновляем или добавляем новые каналы без дубликатов
+            started = time.perf_counter()
+            existing = read_json(filename, [])
+            FILE_IO_SECONDS.observe(time.perf_counter() - started, target="region", op="read")
+            if os.path.exists(filename):
+                FILE_IO_BYTES.inc(os.path.getsize(filename), target="region", op="read")
+
+            existing_map_channels = {c["channel_id"]: c for c in existing}
+            existing_map_channels.update(pending)
+            unique_channels = list(existing_map_channels.values())
+            started = time.perf_counter()
+            written = atomic_write_json(filename, unique_channels)
+            FILE_IO_SECONDS.observe(time.perf_counter() - started, target="region", op="write")
+            FILE_IO_BYTES.inc(written, target="region", op="write")
+            counts[filename] = len(unique_channels)
+
+        return counts
@@ -0,0 +1,434 @@
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+from zoneinfo import ZoneInfo
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from storage import atomic_write_json, read_json
+import json_codec
+import metrics
+import os
+import random
+import threading
+import time
+
+API_KEYS_FILE = "api_keys.txt"
+USAGE_FILE = "api_key_usage.json"
+# Дневная квота ключа в единицах; videos.list и channels.list стоят по 1 единице
+DAILY_QUOTA = int(os.environ.get("YT_DAILY_QUOTA", "10000"))
+# Квота YouTube сбрасывается в полночь по тихоокеанскому времени
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+RATE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+RATE_COOLDOWN = 60.0
+SAVE_INTERVAL = 10.0
+# channels.list принимает до 50 id за запрос
+CHANNELS_BATCH = 50
+# Свободных keep-alive соединений в пуле; больше воркеров держать смысла нет
+HTTP_POOL_SIZE = int(os.environ.get("YT_HTTP_POOL_SIZE", "32"))
+# Ответов с ETag в памяти: 104 региона x 13 категорий x несколько страниц
+ETAG_CACHE_SIZE = int(os.environ.get("YT_ETAG_CACHE_SIZE", "8192"))
+
+API_LATENCY = metrics.histogram("youtube_api_request_seconds", "Время запроса к YouTube API",
+                                ("method", "region", "category"))
+# channels.list запрашивает пачки каналов сразу из многих регионов — без меток region/category
+CHANNELS_LATENCY = metrics.histogram("youtube_api_channels_request_seconds",
+                                     "Время запроса channels.list к YouTube API")
+QUOTA_UNITS = metrics.counter("youtube_quota_units_total", "Списано единиц квоты по ключам", ("key",))
+API_ERRORS = metrics.counter("youtube_api_errors_total", "Ошибки HTTP от YouTube API по reason",
+                             ("reason",))
+HTTP_CONNECTIONS = metrics.counter("youtube_http_connections_total",
+                                   "Создано httplib2.Http (новых TLS-соединений) для YouTube API")
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def discovery_document():
+    """Discovery-документ YouTube Data API v3 (из googleapiclient), разобранный один раз на процесс."""
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            content = get_static_doc("youtube", "v3")
+            _discovery = json_codec.loads(content) if content else None
+        return _discovery
+
+
+def build_client(key):
+    """Клиент YouTube Data API для ключа без повторного разбора discovery-документа."""
+    document = discovery_document()
+    if document is None:
+        return build("youtube", "v3", developerKey=key)
+    return build_from_document(document, developerKey=key)
+
+
+class QuotaExhausted(Exception):
+    """У всех ключей закончилась дневная квота."""
+
+
+def load_api_keys(path=API_KEYS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [k.strip() for k in f.read().split(",") if k.strip()]
+
+
+def error_reason(e):
+    """reason из тела ответа HttpError (quotaExceeded, rateLimitExceeded, ...)."""
+    try:
+        body = json_codec.loads(e.content)
+        return body["error"]["errors"][0]["reason"]
+    except Exception:
+        return None
+
+
+def is_retryable(e):
+    """Временные ошибки: сеть, 5xx и 429. Остальные 4xx повторять бессмысленно."""
+    if isinstance(e, QuotaExhausted):
+        return False
+    if isinstance(e, HttpError):
+        return e.resp.status == 429 or e.resp.status >= 500
+    return True
+
+
+def retry_with_backoff(fn, attempts=5, base_delay=1.0, max_delay=60.0):
+    """Вызывает fn() с повторами и экспоненциальной задержкой (с джиттером)."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Retry {attempt + 1}/{attempts - 1} in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket: общий лимит запросов к YouTube API
+    для всех воркеров коллектора.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Блокирует поток, пока в корзине не наберётся tokens токенов."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpPool:
+    """
+    Пул httplib2.Http с keep-alive соединениями к YouTube API.
+    Http не потокобезопасен, поэтому запрос берёт свободный объект на время
+    execute() и возвращает его; соединения переживают потоки и циклы сбора.
+    """
+
+    def __init__(self, max_idle=HTTP_POOL_SIZE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            http = self._idle.pop() if self._idle else None
+        if http is None:
+            http = build_http()
+            HTTP_CONNECTIONS.inc()
+        try:
+            yield http
+        except HttpError:
+            # Ответ с ошибкой получен целиком — соединение исправно
+            self._release(http)
+            raise
+        except Exception:
+            # Сетевая ошибка: соединение могло остаться в неизвестном состоянии
+            for conn in http.connections.values():
+                conn.close()
+            raise
+        else:
+            self._release(http)
+
+    def _release(self, http):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(http)
+
+
+class ETagCache:
+    """
+    Условные запросы: ответ сохраняется вместе с ETag, повторный такой же запрос
+    уходит с If-None-Match, и на 304 Not Modified отдаётся сохранённый ответ.
+    Ключ — URI без параметра key, чтобы ответ переиспользовался между ключами.
+    """
+
+    def __init__(self, max_entries=ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def cache_key(request):
+        parts = urlsplit(request.uri)
+        query = sorted((k, v) for k, v in parse_qsl(parts.query) if k != "key")
+        return request.method, parts.path, tuple(query)
+
+    def prepare(self, request):
+        """Добавляет If-None-Match. Возвращает (ключ, сохранённый ответ или None, заголовки ответа)."""
+        key = self.cache_key(request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        response_headers = {}
+        request.add_response_callback(response_headers.update)
+        if entry is None:
+            return key, None, response_headers
+        request.headers["If-None-Match"] = entry[0]
+        return key, entry[1], response_headers
+
+    def store(self, key, etag, body):
+        if not etag:
+            return
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class KeyPool:
+    """
+    Пул API-ключей с учётом расхода квоты по дням.
+    При 403 quota/rate переключается на следующий живой ключ и повторяет запрос.
+    Счётчики сохраняются в USAGE_FILE и переживают перезапуск.
+    Клиент на ключ один на процесс, HTTP-соединения берутся из общего HttpPool.
+    """
+
+    def __init__(self, build_client=build_client, keys=None, usage_file=USAGE_FILE,
+                 daily_quota=DAILY_QUOTA, rate_limiter=None, http_pool=None, etag_cache=None):
+        self.build_client = build_client
+        self.http_pool = http_pool or HttpPool()
+        self.etag_cache = etag_cache or ETagCache()
+        self.keys = keys if keys is not None else load_api_keys()
+        if not self.keys:
+            raise ValueError("Список API-ключей пуст")
+        self.usage_file = usage_file
+        self.daily_quota = daily_quota
+        self.rate_limiter = rate_limiter
+        self._lock = threading.Lock()
+        self._next = 0
+        self._cooldown = {}
+        self._clients = {}
+        self._saved_at = 0.0
+        self._day, self._usage = self._load_usage()
+
+    @staticmethod
+    def _today():
+        return datetime.now(QUOTA_TZ).date().isoformat()
+
+    def _load_usage(self):
+        today = self._today()
+        if os.path.exists(self.usage_file):
+            try:
+                data = read_json(self.usage_file)
+                if data.get("date") == today:
+                    return today, {k: int(v) for k, v in data.get("usage", {}).items()}
+            except Exception as e:
+                print(f"Failed to read {self.usage_file}: {e}")
+        return today, {}
+
+    def save(self):
+        with self._lock:
+            data = {"date": self._day, "usage": dict(self._usage)}
+            self._saved_at = time.monotonic()
+        atomic_write_json(self.usage_file, data)
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day, self._usage = today, {}
+            self._cooldown.clear()
+
+    def remaining(self, key):
+        with self._lock:
+            self._roll_day()
+            return self.daily_quota - self._usage.get(key, 0)
+
+    def _acquire(self, cost):
+        """
+        Следующий по кругу ключ с остатком квоты; сразу списывает cost единиц.
+        Если все ключи с квотой на паузе после rate limit, ждёт ближайший из них;
+        QuotaExhausted — только когда квота кончилась у всех ключей.
+        """
+        while True:
+            with self._lock:
+                self._roll_day()
+                now = time.monotonic()
+                wake_at = None
+                for _ in range(len(self.keys)):
+                    key = self.keys[self._next]
+                    self._next = (self._next + 1) % len(self.keys)
+                    if self._usage.get(key, 0) + cost > self.daily_quota:
+                        continue
+                    cooldown = self._cooldown.get(key, 0)
+                    if cooldown > now:
+                        wake_at = cooldown if wake_at is None else min(wake_at, cooldown)
+                        continue
+                    self._usage[key] = self._usage.get(key, 0) + cost
+                    QUOTA_UNITS.inc(cost, key=f"...{key[-4:]}")
+                    return key
+            if wake_at is None:
+                raise QuotaExhausted("No API key with remaining quota")
+            time.sleep(wake_at - now)
+
+    def _mark_exhausted(self, key):
+        with self._lock:
+            self._usage[key] = self.daily_quota
+
+    def _mark_rate_limited(self, key):
+        with self._lock:
+            self._cooldown[key] = time.monotonic() + RATE_COOLDOWN
+
+    def client(self, key):
+        # Клиент только строит запросы; непотокобезопасный Http передаётся в execute()
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self.build_client(key)
+            return client
+
+    def execute(self, make_request, cost=1, labels=None, conditional=False, latency=API_LATENCY):
+        """
+        make_request(youtube) должен вернуть запрос googleapiclient.
+        Повторяет запрос с другими ключами при исчерпании квоты или rate limit.
+        latency — гистограмма задержки, labels — её метки (для API_LATENCY: method, region, category).
+        conditional=True — запрос с If-None-Match по ETag прошлого такого же ответа.
+        """
+        while True:
+            key = self._acquire(cost)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            cached = None
+            try:
+                request = make_request(self.client(key))
+                if conditional:
+                    cache_key, cached, response_headers = self.etag_cache.prepare(request)
+                with latency.time(**(labels or {})), self.http_pool.connection() as http:
+                    body = request.execute(http=http)
+                if conditional:
+                    metrics.CACHE_REQUESTS.inc(cache="etag", result="miss")
+                    self.etag_cache.store(cache_key, response_headers.get("etag"), body)
+                return body
+            except HttpError as e:
+                if e.resp.status == 304 and cached is not None:
+                    metrics.CACHE_REQUESTS.inc(cache="etag", result="hit")
+                    return cached
+                reason = error_reason(e)
+                API_ERRORS.inc(reason=reason or str(e.resp.status))
+                if e.resp.status == 403 and reason in QUOTA_REASONS:
+                    print(f"API key ...{key[-4:]}: {reason}, switching key")
+                    self._mark_exhausted(key)
+                elif e.resp.status in (403, 429) and reason in RATE_REASONS:
+                    print(f"API key ...{key[-4:]}: {reason}, switching key")
+                    self._mark_rate_limited(key)
+                else:
+                    raise
+            finally:
+                if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                    self.save()
+
+
+class ChannelStatsCache:
+    """
+    Общий для всех регионов кеш channels.list (snippet,statistics) по channel_id с TTL.
+    Недостающие id от разных потоков копятся в одну очередь и запрашиваются
+    пачками по 50, так что канал из десятка регионов запрашивается один раз.
+    """
+
+    def __init__(self, key_pool, ttl, max_wait=0.2):
+        self.key_pool = key_pool
+        self.ttl = ttl
+        # Сколько ждать, пока другие регионы доберут пачку до 50 id
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        # channel_id -> (время загрузки, item или None, если канал не найден)
+        self._cache = {}
+        self._inflight = {}
+        self._pending = []
+
+    def get_many(self, channel_ids):
+        """channel_id -> item из channels.list; ненайденные каналы пропускаются."""
+        result = {}
+        waits = []
+        now = time.monotonic()
+        with self._lock:
+            for cid in dict.fromkeys(channel_ids):
+                cached = self._cache.get(cid)
+                if cached and now - cached[0] < self.ttl:
+                    metrics.CACHE_REQUESTS.inc(cache="channel_stats", result="hit")
+                    if cached[1] is not None:
+                        result[cid] = cached[1]
+                    continue
+                metrics.CACHE_REQUESTS.inc(cache="channel_stats", result="miss")
+                future = self._inflight.get(cid)
+                if future is None:
+                    future = self._inflight[cid] = Future()
+                    self._pending.append(cid)
+                waits.append((cid, future))
+
+        if waits:
+            self._drain(full_only=True)
+            wait([f for _, f in waits], timeout=self.max_wait)
+            self._drain(full_only=False)
+            for cid, future in waits:
+                item = future.result()
+                if item is not None:
+                    result[cid] = item
+        return result
+
+    def _drain(self, full_only):
+        while True:
+            with self._lock:
+                if not self._pending or (full_only and len(self._pending) < CHANNELS_BATCH):
+                    return
+                batch = self._pending[:CHANNELS_BATCH]
+                del self._pending[:CHANNELS_BATCH]
+            self._fetch(batch)
+
+    def _fetch(self, batch):
+        try:
+            response = self.key_pool.execute(lambda youtube: youtube.channels().list(
+                part="snippet,statistics",
+                id=",".join(batch)
+            ), latency=CHANNELS_LATENCY)
+        except Exception as e:
+            with self._lock:
+                for cid in batch:
+                    self._inflight.pop(cid).set_exception(e)
+            return
+
+        items = {item["id"]: item for item in response.get("items", [])}
+        now = time.monotonic()
+        with self._lock:
+            for cid in batch:
+                item = items.get(cid)
+                self._cache[cid] = (now, item)
+                self._inflight.pop(cid).set_result(item)